@@ -1,3 +1,5 @@
-from .connection import engine, Base, get_db
+from .connection import (
+    Base, dispose_engines, get_async_db, get_async_engine, get_db, get_engine, read_session,
+)
 
-__all__ = ["engine", "Base", "get_db"] 
\ No newline at end of file
+__all__ = ["Base", "dispose_engines", "get_async_db", "get_async_engine", "get_db", "get_engine", "read_session"]
@@ -1,8 +1,15 @@
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import CompoundSelect, Select, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.requests import Request
+from . import pool
 
 # Load environment variables
 load_dotenv(override=True)
@@ -13,17 +20,152 @@ DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 DB_NAME = os.getenv('DB_NAME')
 
-# Build database URL from environment variables
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  # Enables automatic reconnection
-    pool_size=5,         # Maximum number of connections to keep persistently
-    max_overflow=10      # Maximum number of connections to create above pool_size
+def _async_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]).render_as_string(hide_password=False)
+
+# Build database URL from environment variables; DATABASE_URL (a SQLAlchemy
+# URL with a sync driver, e.g. sqlite:///library.db) overrides the parts
+DATABASE_URL = os.getenv("DATABASE_URL")
+SQLALCHEMY_DATABASE_URL = DATABASE_URL or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_SQLALCHEMY_DATABASE_URL = _async_url(DATABASE_URL) if DATABASE_URL else f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# Optional read replicas: comma-separated SQLAlchemy URLs with a sync driver
+# (e.g. mysql+pymysql://...); the async driver is derived from each
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+# Connections per pool, per worker process; every engine has one pool
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# After a user writes, their reads stay on the primary this many seconds so
+# they see their own changes despite replication lag
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+def _pool_options(url: str, poolclass) -> dict:
+    options = {
+        "poolclass": poolclass,
+        "pool_pre_ping": True,  # Enables automatic reconnection
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+    if make_url(url).get_backend_name() == "sqlite":
+        # Pooled connections move between threads; writers wait for the file lock
+        options["connect_args"] = {"check_same_thread": False, "timeout": 30}
+    return options
+
+# Engines are created on first use (or by the app's lifespan), never at
+# import: importing the app must not load drivers or touch the database
+_engines = {}
+_engines_lock = threading.Lock()
+
+def _get(name: str, create):
+    with _engines_lock:
+        if name not in _engines:
+            _engines[name] = create()
+            pool.register(name, _engines[name])
+        return _engines[name]
+
+def get_engine():
+    """The sync engine of the primary, used by CLI scripts and background jobs"""
+    return _get("primary:sync", lambda: create_engine(
+        SQLALCHEMY_DATABASE_URL, **_pool_options(SQLALCHEMY_DATABASE_URL, pool.InstrumentedQueuePool)
+    ))
+
+def get_async_engine():
+    """The async engine of the primary, used by request handlers so queries never block the event loop"""
+    return _get("primary:async", lambda: create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL, **_pool_options(ASYNC_SQLALCHEMY_DATABASE_URL, pool.InstrumentedAsyncQueuePool)
+    ))
+
+def get_replica_engines() -> list:
+    """Sync engines of the read replicas; empty when none are configured"""
+    return [
+        _get(f"replica{i}:sync", lambda url=url: create_engine(url, **_pool_options(url, pool.InstrumentedQueuePool)))
+        for i, url in enumerate(DB_REPLICA_URLS)
+    ]
+
+def get_async_replica_engines() -> list:
+    """Async engines of the read replicas; empty when none are configured"""
+    return [
+        _get(f"replica{i}:async", lambda url=url: create_async_engine(
+            _async_url(url), **_pool_options(url, pool.InstrumentedAsyncQueuePool)
+        ))
+        for i, url in enumerate(DB_REPLICA_URLS)
+    ]
+
+async def dispose_engines():
+    """Close the pooled connections of the engines created so far; they reconnect on next use"""
+    with _engines_lock:
+        engines = list(_engines.values())
+    for engine in engines:
+        if isinstance(engine, AsyncEngine):
+            await engine.dispose()
+        else:
+            engine.dispose()
+
+# Session.info key: route plain SELECTs of this session to a replica
+READ_REPLICA = "read_replica"
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica when opened for reading.
+
+    Only sessions created with info={READ_REPLICA: True} use replicas, and
+    only for plain SELECTs (no FOR UPDATE). Flushes, DML and raw
+    connections always go to the primary, and once the session has written
+    it stays there so it reads its own writes.
+    """
+
+    def replicas(self) -> list:
+        return get_replica_engines()
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kw)
+        reads = isinstance(clause, (Select, CompoundSelect)) and clause._for_update_arg is None
+        if not reads or self._flushing:
+            self.info["wrote"] = True
+            return primary
+        if not self.info.get(READ_REPLICA) or self.info.get("wrote"):
+            return primary
+        if "replica" not in self.info:
+            # One replica per session, so its reads are consistent with each other
+            replicas = self.replicas()
+            self.info["replica"] = random.choice(replicas) if replicas else None
+        return self.info["replica"] or primary
+
+class AsyncRoutingSession(RoutingSession):
+    """RoutingSession behind an AsyncSession; routes to the async replicas"""
+
+    def replicas(self) -> list:
+        return [engine.sync_engine for engine in get_async_replica_engines()]
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker bound to get_engine() when it makes its first session"""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+class LazyAsyncSessionmaker(async_sessionmaker):
+    """async_sessionmaker bound to get_async_engine() when it makes its first session"""
+
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_async_engine())
+        return super().__call__(**local_kw)
+
+SessionLocal = LazySessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+AsyncSessionLocal = LazyAsyncSessionmaker(
+    class_=AsyncSession, sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def read_session():
+    """Session whose SELECTs go to a replica, for reports and exports"""
+    return SessionLocal(info={READ_REPLICA: True})
 
 Base = declarative_base()
 
@@ -32,4 +174,14 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db(request: Request):
+    """Request session: GET and HEAD requests read from a replica, unless the
+    user wrote within the last DB_READ_YOUR_WRITES_SECONDS"""
+    wrote_at = request.session.get("db_write_at", 0) if "session" in request.scope else 0
+    reads = request.method in ("GET", "HEAD") and time.time() - wrote_at > DB_READ_YOUR_WRITES_SECONDS
+    async with AsyncSessionLocal(info={READ_REPLICA: reads}) as db:
+        yield db
+        if db.info.get("wrote") and "session" in request.scope:
+            request.session["db_write_at"] = time.time()
@@ -0,0 +1,19 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import Integer
+
+class days_between(FunctionElement):
+    """Whole days elapsed from the first datetime to the second, truncated"""
+    type = Integer()
+    name = "days_between"
+    inherit_cache = True
+
+@compiles(days_between)
+def _days_between_mysql(element, compiler, **kw):
+    start, end = element.clauses
+    return f"TIMESTAMPDIFF(DAY, {compiler.process(start, **kw)}, {compiler.process(end, **kw)})"
+
+@compiles(days_between, "sqlite")
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = element.clauses
+    return f"CAST(julianday({compiler.process(end, **kw)}) - julianday({compiler.process(start, **kw)}) AS INTEGER)"
@@ -0,0 +1,58 @@
+import logging
+from contextlib import contextmanager
+from sqlalchemy import inspect, text
+from .connection import Base
+from . import models  # noqa: F401 - registers the tables on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# Name of the MySQL advisory lock serialising concurrent migrations
+MIGRATION_LOCK = "library_schema_migration"
+MIGRATION_LOCK_TIMEOUT = 300
+
+@contextmanager
+def _migration_lock(conn):
+    """Hold a MySQL advisory lock so that two deploys never migrate at once"""
+    if conn.dialect.name != "mysql":
+        yield
+        return
+    acquired = conn.execute(
+        text("SELECT GET_LOCK(:name, :timeout)"), {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT}
+    ).scalar()
+    if acquired != 1:
+        raise TimeoutError(f"Could not acquire the {MIGRATION_LOCK} lock within {MIGRATION_LOCK_TIMEOUT}s")
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
+
+def pending_changes(conn) -> list:
+    """Tables and indexes of the models that the database does not have yet"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            pending.append(("table", table.name, table))
+            continue
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing_indexes:
+                pending.append(("index", index.name, index))
+    return pending
+
+def migrate(engine, dry_run: bool = False) -> list:
+    """Create missing tables and indexes; returns what was (or would be) created.
+
+    Safe to run from several processes at once. Columns added to existing
+    tables are not detected; alter those by hand.
+    """
+    with engine.connect() as conn:
+        with _migration_lock(conn):
+            pending = pending_changes(conn)
+            if not dry_run:
+                for kind, name, item in pending:
+                    logger.info("Creating %s %s", kind, name)
+                    item.create(bind=conn, checkfirst=True)
+                conn.commit()
+    return [(kind, name) for kind, name, _ in pending]
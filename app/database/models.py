@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum as SQLEnum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Enum as SQLEnum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 import enum
@@ -9,15 +9,34 @@ class UserRole(enum.Enum):
     ADMIN = "ADMIN"
     MEMBER = "MEMBER"
 
-# Base Mixin for common columns
+class ReservationStatus(enum.Enum):
+    WAITING = "WAITING"      # queued for the book
+    READY = "READY"          # a copy is set aside until expires_at
+    FULFILLED = "FULFILLED"  # borrowed
+    CANCELLED = "CANCELLED"
+    EXPIRED = "EXPIRED"      # not picked up in time
+
+def utcnow() -> datetime:
+    """The current time as naive UTC, the way DateTime columns store it"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Base Mixin for common columns; the defaults are callables so every
+# insert and update gets its own timestamp (naive UTC, like DateTime stores)
 class BaseMixin:
-    created_at = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
-    updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, nullable=False)
     is_deleted = Column(Boolean, default=False, nullable=False)
 
 class User(Base, BaseMixin):
     __tablename__ = "users"
-    __table_args__ = {'comment': 'Stores user information including library members and administrators'}
+    __table_args__ = (
+        # Keyset pagination of the admin member listing
+        Index("ix_users_role_created_at_id", "role", "created_at", "id"),
+        Index("ix_users_role_username_id", "role", "username", "id"),
+        # Pages of members in id order (JSON API)
+        Index("ix_users_role_is_deleted_id", "role", "is_deleted", "id"),
+        {'comment': 'Stores user information including library members and administrators'}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(100), unique=True, index=True, nullable=False)
@@ -34,7 +53,18 @@ class User(Base, BaseMixin):
 
 class Book(Base, BaseMixin):
     __tablename__ = "books"
-    __table_args__ = {'comment': 'Contains information about books in the library inventory'}
+    __table_args__ = (
+        # Keyset pagination of catalog listings, one index per sort order
+        Index("ix_books_is_deleted_title_id", "is_deleted", "title", "id"),
+        Index("ix_books_is_deleted_author_id", "is_deleted", "author", "id"),
+        Index("ix_books_is_deleted_created_at_id", "is_deleted", "created_at", "id"),
+        Index("ix_books_is_deleted_available_copies_id", "is_deleted", "available_copies", "id"),
+        # Books of a category
+        Index("ix_books_category_id_is_deleted_id", "category_id", "is_deleted", "id"),
+        # Pages of books in id order (JSON API)
+        Index("ix_books_is_deleted_id", "is_deleted", "id"),
+        {'comment': 'Contains information about books in the library inventory'}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -63,12 +93,26 @@ class Category(Base, BaseMixin):
 
 class BookLoan(Base, BaseMixin):
     __tablename__ = "book_loans"
-    __table_args__ = {'comment': 'Tracks book borrowing transactions including due dates and returns'}
+    __table_args__ = (
+        # Incremental fine computation: changed loans and loans still accruing
+        Index("ix_book_loans_updated_at_id", "updated_at", "id"),
+        Index("ix_book_loans_is_returned_due_date_id", "is_returned", "due_date", "id"),
+        # Open loans of a member, in due date order (dashboard, member listing)
+        Index("ix_book_loans_user_id_is_returned_is_deleted_due_date", "user_id", "is_returned", "is_deleted", "due_date"),
+        # Open loans of a book, and its loan history newest first
+        Index("ix_book_loans_book_id_is_returned_is_deleted", "book_id", "is_returned", "is_deleted"),
+        Index("ix_book_loans_book_id_is_deleted_borrowed_date_id", "book_id", "is_deleted", "borrowed_date", "id"),
+        # A member's loans in id order (JSON API)
+        Index("ix_book_loans_user_id_is_deleted_id", "user_id", "is_deleted", "id"),
+        # Returned loans old enough to archive
+        Index("ix_book_loans_is_returned_borrowed_date_id", "is_returned", "borrowed_date", "id"),
+        {'comment': 'Tracks book borrowing transactions including due dates and returns'}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
-    borrowed_date = Column(DateTime, default=datetime.utcnow, nullable=False)
+    borrowed_date = Column(DateTime, default=utcnow, index=True, nullable=False)
     due_date = Column(DateTime, nullable=False)
     returned_date = Column(DateTime)
     fine_amount = Column(Integer, default=0)  # Store fine in cents/paise
@@ -78,9 +122,62 @@ class BookLoan(Base, BaseMixin):
     user = relationship("User", back_populates="borrowed_books")
     book = relationship("Book", back_populates="loans")
 
+class BookLoanArchive(Base, BaseMixin):
+    __tablename__ = "book_loans_archive"
+    __table_args__ = (
+        # Member and book loan history, newest first
+        Index("ix_book_loans_archive_user_id_borrowed_date_id", "user_id", "borrowed_date", "id"),
+        Index("ix_book_loans_archive_book_id_borrowed_date_id", "book_id", "borrowed_date", "id"),
+        {'comment': 'Returned loans moved out of book_loans once they are old; ids are kept'}
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    borrowed_date = Column(DateTime, nullable=False)
+    due_date = Column(DateTime, nullable=False)
+    returned_date = Column(DateTime)
+    fine_amount = Column(Integer, default=0)
+    is_returned = Column(Boolean, default=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    # Relationships
+    user = relationship("User")
+    book = relationship("Book")
+
+class Reservation(Base, BaseMixin):
+    __tablename__ = "reservations"
+    __table_args__ = (
+        # A book's queue in serving order, and positions within it
+        Index("ix_reservations_book_id_status_priority_id", "book_id", "status", "priority", "id"),
+        # A member's holds
+        Index("ix_reservations_user_id_status_book_id", "user_id", "status", "book_id"),
+        # Ready holds past their pickup deadline, and holds that just became ready
+        Index("ix_reservations_status_expires_at_id", "status", "expires_at", "id"),
+        Index("ix_reservations_status_ready_at", "status", "ready_at"),
+        {'comment': 'Member holds on borrowed-out books, served per book by priority, then first come first served'}
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    book_id = Column(Integer, ForeignKey('books.id'), nullable=False)
+    status = Column(SQLEnum(ReservationStatus), default=ReservationStatus.WAITING, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)  # Lower is served first
+    ready_at = Column(DateTime)
+    expires_at = Column(DateTime)
+
+    # Relationships
+    user = relationship("User")
+    book = relationship("Book")
+
 class Fine(Base, BaseMixin):
     __tablename__ = "fines"
-    __table_args__ = {'comment': 'Records fines for overdue books and their payment status'}
+    __table_args__ = (
+        # Fines of a loan (member totals, fine computation) and paid fines by month
+        Index("ix_fines_loan_id_is_deleted_is_paid", "loan_id", "is_deleted", "is_paid"),
+        Index("ix_fines_is_paid_paid_date", "is_paid", "paid_date"),
+        {'comment': 'Records fines for overdue books and their payment status'}
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     loan_id = Column(Integer, ForeignKey('book_loans.id'), nullable=False)
@@ -89,4 +186,48 @@ class Fine(Base, BaseMixin):
     is_paid = Column(Boolean, default=False)
 
     # Relationships
-    loan = relationship("BookLoan") 
\ No newline at end of file
+    loan = relationship("BookLoan")
+
+class LibraryStat(Base):
+    __tablename__ = "library_stats"
+    __table_args__ = {'comment': 'Incrementally maintained counters backing the admin dashboard'}
+
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, default=0, nullable=False)
+
+class BookSearchTerm(Base):
+    __tablename__ = "book_search_terms"
+    __table_args__ = (
+        Index("ix_book_search_terms_term_weight", "term", "weight", "book_id"),
+        Index("ix_book_search_terms_book_id", "book_id"),
+        {'comment': 'Inverted index of catalog terms to books, maintained on book writes'}
+    )
+
+    term = Column(String(64), primary_key=True)
+    book_id = Column(Integer, ForeignKey('books.id'), primary_key=True)
+    weight = Column(Integer, nullable=False)
+
+class SearchVocabulary(Base):
+    __tablename__ = "search_vocabulary"
+    __table_args__ = {'comment': 'Distinct catalog terms with document counts, used for autocomplete'}
+
+    term = Column(String(64), primary_key=True)
+    doc_count = Column(Integer, default=0, nullable=False)
+
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+    __table_args__ = {'comment': 'Progress markers of incremental background jobs'}
+
+    name = Column(String(50), primary_key=True)
+    value = Column(DateTime, nullable=False)
+
+class BookAvailabilityChange(Base):
+    __tablename__ = "book_availability_changes"
+    __table_args__ = (
+        Index("ix_book_availability_changes_changed_at", "changed_at"),
+        {'comment': 'Recent changes to book copies, polled by workers to expire cached availability'}
+    )
+
+    id = Column(Integer, primary_key=True)
+    book_id = Column(Integer, nullable=False)
+    changed_at = Column(DateTime, nullable=False)
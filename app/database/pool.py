@@ -0,0 +1,111 @@
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class PoolStats:
+    """Checkout counters of one pool; they survive the pool being recreated"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.max_checked_out = 0
+        self.lock = threading.Lock()
+
+    def observe(self, waited: float, checked_out: int, size: int):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_sum += waited
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self.wait_buckets[i] += 1
+            if checked_out > size:
+                self.overflow_checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, checked_out)
+
+class _InstrumentedPool:
+    """Times how long checkouts wait for a connection and counts overflow use"""
+
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeout:
+            if self.stats is not None:
+                with self.stats.lock:
+                    self.stats.timeouts += 1
+            raise
+        if self.stats is not None:
+            self.stats.observe(time.perf_counter() - started, self.checkedout(), self.size())
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+# Pool name -> (engine, stats)
+_pools = {}
+
+def register(name: str, engine):
+    """Collect the checkout metrics of `engine`'s pool under `name`"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    if isinstance(pool, _InstrumentedPool):
+        pool.stats = pool.stats or PoolStats()
+        _pools[name] = (getattr(engine, "sync_engine", engine), pool.stats)
+
+def render() -> str:
+    """Pool gauges and checkout counters in the Prometheus text format"""
+    lines = []
+
+    def metric(name, kind, help_text, values):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(values)
+
+    pools = sorted(_pools.items())
+    gauges = []
+    for name, (engine, stats) in pools:
+        pool = engine.pool
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        gauges.append((name, pool.size(), pool.checkedout(), max(pool.overflow(), 0),
+                       pool.checkedout() / capacity if capacity else 0.0, stats))
+    metric("db_pool_size", "gauge", "Connections the pool keeps open.",
+           [f'db_pool_size{{pool="{name}"}} {size}' for name, size, *_ in gauges])
+    metric("db_pool_checked_out", "gauge", "Connections currently in use.",
+           [f'db_pool_checked_out{{pool="{name}"}} {used}' for name, _, used, *_ in gauges])
+    metric("db_pool_overflow", "gauge", "Connections open beyond the pool size.",
+           [f'db_pool_overflow{{pool="{name}"}} {overflow}' for name, _, _, overflow, *_ in gauges])
+    metric("db_pool_saturation", "gauge", "Share of pool size plus max overflow in use.",
+           [f'db_pool_saturation{{pool="{name}"}} {saturation:.3f}' for name, *_, saturation, _ in gauges])
+    metric("db_pool_max_checked_out", "gauge", "Most connections in use at once since startup.",
+           [f'db_pool_max_checked_out{{pool="{name}"}} {stats.max_checked_out}' for name, *_, stats in gauges])
+    metric("db_pool_overflow_checkouts_total", "counter", "Checkouts served by an overflow connection.",
+           [f'db_pool_overflow_checkouts_total{{pool="{name}"}} {stats.overflow_checkouts}' for name, *_, stats in gauges])
+    metric("db_pool_checkout_timeouts_total", "counter", "Checkouts that gave up waiting for a connection.",
+           [f'db_pool_checkout_timeouts_total{{pool="{name}"}} {stats.timeouts}' for name, *_, stats in gauges])
+
+    histogram = []
+    for name, *_, stats in gauges:
+        with stats.lock:
+            for bound, count in zip(WAIT_BUCKETS, stats.wait_buckets):
+                histogram.append(f'db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="{bound}"}} {count}')
+            histogram.append(f'db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="+Inf"}} {stats.checkouts}')
+            histogram.append(f'db_pool_checkout_wait_seconds_sum{{pool="{name}"}} {stats.wait_sum:.6f}')
+            histogram.append(f'db_pool_checkout_wait_seconds_count{{pool="{name}"}} {stats.checkouts}')
+    metric("db_pool_checkout_wait_seconds", "histogram", "Time spent waiting for a pooled connection.", histogram)
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel, EmailStr
 from app.database.models import UserRole
 
@@ -10,4 +12,52 @@ class User(UserBase):
     role: UserRole
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+# Resources of the JSON API (/api/v1). Their fields, in this order, are what
+# `?fields=` selects from; id is always included
+
+class Member(UserBase):
+    id: int
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class Book(BaseModel):
+    id: int
+    title: str
+    author: str
+    isbn: Optional[str] = None
+    publisher: Optional[str] = None
+    publication_year: Optional[int] = None
+    category: Optional[str] = None
+    total_copies: int
+    available_copies: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class Loan(BaseModel):
+    id: int
+    user_id: int
+    book_id: int
+    borrowed_date: datetime
+    due_date: datetime
+    returned_date: Optional[datetime] = None
+    is_returned: bool
+    fine_amount: int
+
+    class Config:
+        from_attributes = True
+
+class LibraryStats(BaseModel):
+    borrowed_books: int
+    total_books: int
+    total_members: int
+    total_rent_current_month: int
@@ -0,0 +1,25 @@
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+def upsert(conn, model, rows, keys, update):
+    """Insert `rows`, updating existing rows that collide on `keys`.
+
+    `update` maps column names to callables receiving the incoming row
+    namespace (VALUES()/excluded) and returning the new value expression.
+    Supports MySQL and SQLite. Rows are sent as one executemany, which the
+    drivers batch without compiling a statement per row.
+    """
+    if not rows:
+        return
+    if conn.dialect.name == "mysql":
+        stmt = mysql_insert(model)
+        stmt = stmt.on_duplicate_key_update(
+            {column: build(stmt.inserted) for column, build in update.items()}
+        )
+    else:
+        stmt = sqlite_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: build(stmt.excluded) for column, build in update.items()}
+        )
+    conn.execute(stmt, rows)
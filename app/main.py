@@ -1,32 +1,69 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Depends
 from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
-from app.database import engine, Base
+from app.database import dispose_engines, get_async_engine, get_engine
 from app.database.models import UserRole
-from app.routers import auth, admin, member
+from app.routers import api, auth, admin, member
+from app.services import archive, availability, circulation, fines, notifications, recommendations, stats
 from app.utils.auth import login_required
+from app.templating import precompile_templates
+from app.utils.assets import PrecompressedStaticFiles, static_directory
+from app.utils.metrics import RequestMetricsMiddleware, instrument_engine
+from app.utils.tasks import run_periodically
+
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "900"))
+FINE_JOB_INTERVAL = float(os.getenv("FINE_JOB_INTERVAL", "3600"))
+LOAN_ARCHIVE_INTERVAL = float(os.getenv("LOAN_ARCHIVE_INTERVAL", "86400"))
+HOLD_SWEEP_INTERVAL = float(os.getenv("HOLD_SWEEP_INTERVAL", "300"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engines are built here, once per worker, rather than at import; the
+    # schema is migrated separately with `python migrate.py`
+    instrument_engine(get_engine())
+    instrument_engine(get_async_engine())
+    # Compile templates now rather than on the first request that needs each one
+    precompile_templates()
+    # Map the "readers also borrowed" artifact, if one has been built
+    recommendations.similar_books_index.reload()
+    # Background jobs, cancelled on shutdown
+    background_tasks = [
+        asyncio.create_task(run_periodically(STATS_RECONCILE_INTERVAL, stats.reconcile_job)),
+        asyncio.create_task(run_periodically(FINE_JOB_INTERVAL, fines.compute_fines_job)),
+        asyncio.create_task(run_periodically(LOAN_ARCHIVE_INTERVAL, archive.archive_loans_job)),
+        asyncio.create_task(run_periodically(HOLD_SWEEP_INTERVAL, circulation.expire_holds_job)),
+        asyncio.create_task(run_periodically(availability.AVAILABILITY_POLL_INTERVAL, availability.sync_job)),
+        asyncio.create_task(run_periodically(60, availability.prune_changes_job)),
+        asyncio.create_task(run_periodically(recommendations.RECOMMENDATIONS_RELOAD_INTERVAL, recommendations.reload_job)),
+        asyncio.create_task(run_periodically(notifications.SSE_POLL_INTERVAL, notifications.poll_job)),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await dispose_engines()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add session middleware
 app.add_middleware(SessionMiddleware, secret_key="your-secret-key-here")
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
-
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Per-request SQL, render and hashing timings (Server-Timing, /admin/metrics);
+# the slow-query log is attached to the engines in the lifespan
+app.add_middleware(RequestMetricsMiddleware)
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# Mount static files: the fingerprinted, precompressed build from
+# build_assets.py when there is one, else the sources as they are
+app.mount("/static", PrecompressedStaticFiles(directory=static_directory()), name="static")
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(admin.router)
 app.include_router(member.router)
+app.include_router(api.router)
 
 # Root route
 @app.get("/")
@@ -1,93 +1,76 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from datetime import date, datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import pool
+from ..database.connection import get_async_db
 from ..database.schemas import UserRole
 from ..routers.auth import get_current_user
+from ..services import circulation, exports, notifications, search, stats
+from ..services import catalog
+from ..services.catalog import BOOK_SORTS
+from ..services.members import MEMBER_SORTS, list_members, member_detail
+from ..templating import templates
 from ..utils.auth import login_required
+from ..utils.conditional import conditional_response, make_etag
+from ..utils.metrics import route_metrics
+from ..utils.pagination import InvalidCursor
 
 router = APIRouter(prefix="/admin", tags=["admin"])
-templates = Jinja2Templates(directory="templates")
+
+BOOKS_PER_PAGE = 20
+MEMBERS_PER_PAGE = 20
 
 @router.get("/dashboard", response_class=HTMLResponse)
 @login_required
-async def admin_dashboard(request: Request, current_user: dict = Depends(get_current_user)):
+async def admin_dashboard(
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     if current_user["role"] != UserRole.ADMIN.value:
         return RedirectResponse(url="/", status_code=302)
     
-    # Dummy data matching your dashboard.html structure
     dashboard_data = {
         "request": request,
-        "borrowed_books": 45,  # Total number of currently borrowed books
-        "total_books": 150,    # Total books in library
-        "total_rent_current_month": 2500,  # Total earnings this month
-        "total_members": 75,   # Total number of members
-        "recent_transactions": [
-            (
-                {"id": 1, "issue_date": "5", "rent_fee": 150},
-                {"title": "Python Programming"}
-            ),
-            (
-                {"id": 2, "issue_date": "10", "rent_fee": 200},
-                {"title": "Data Structures"}
-            ),
-            (
-                {"id": 3, "issue_date": "15", "rent_fee": 175},
-                {"title": "Machine Learning Basics"}
-            ),
-            (
-                {"id": 4, "issue_date": "20", "rent_fee": 225},
-                {"title": "Web Development"}
-            ),
-            (
-                {"id": 5, "issue_date": "25", "rent_fee": 190},
-                {"title": "Database Design"}
-            )
-        ]
+        **await db.run_sync(stats.get_counters),
+        "recent_transactions": await db.run_sync(stats.recent_transactions)
     }
     
     return templates.TemplateResponse("admin/dashboard.html", dashboard_data)
 
 @router.get("/members", response_class=HTMLResponse)
 @login_required
-async def admin_view_members(request: Request, current_user: dict = Depends(get_current_user)):
+async def admin_view_members(
+    request: Request,
+    sort: str = "join_date",
+    cursor: Optional[str] = None,
+    format: str = "html",
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
     if current_user["role"] != UserRole.ADMIN.value:
         return RedirectResponse(url="/", status_code=302)
-    
-    # Dummy member data
+
+    try:
+        rows, next_cursor = await db.run_sync(list_members, sort, cursor, MEMBERS_PER_PAGE)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort '{sort}'")
+
+    if format == "json":
+        return JSONResponse({"items": rows, "sort": sort, "next_cursor": next_cursor})
+
     members_data = {
         "request": request,
-        "members": [
-            {
-                "id": 1,
-                "name": "John Doe",
-                "email": "john@example.com",
-                "role": "Member",
-                "status": "Active",
-                "join_date": "2024-01-15",
-                "books_borrowed": 3
-            },
-            {
-                "id": 2,
-                "name": "Jane Smith",
-                "email": "jane@example.com",
-                "role": "Member",
-                "status": "Active",
-                "join_date": "2024-02-01",
-                "books_borrowed": 1
-            },
-            {
-                "id": 3,
-                "name": "Bob Wilson",
-                "email": "bob@example.com",
-                "role": "Member",
-                "status": "Inactive",
-                "join_date": "2024-01-20",
-                "books_borrowed": 0
-            }
-        ],
-        "total_members": 3,
-        "active_members": 2,
-        "inactive_members": 1
+        "members": rows,
+        "sort": sort,
+        "sorts": list(MEMBER_SORTS),
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        "total_members": (await db.run_sync(stats.get_counters))["total_members"]
     }
     
     return templates.TemplateResponse("admin/members.html", members_data)
@@ -97,59 +80,21 @@ async def admin_view_members(request: Request, current_user: dict = Depends(get_
 async def admin_view_member_detail(
     request: Request, 
     member_id: int, 
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user["role"] != UserRole.ADMIN.value:
         return RedirectResponse(url="/", status_code=302)
-    
-    # Dummy data for a single member
+
+    detail = await db.run_sync(member_detail, member_id)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Member not found")
+
     member_data = {
         "request": request,
-        "member": {
-            "id": member_id,
-            "name": "John Doe",
-            "email": "john@example.com",
-            "role": "Member",
-            "status": "Active",
-            "join_date": "2024-01-15",
-            "phone": "+1234567890",
-            "address": "123 Main St, City, Country",
-            "books_borrowed": 3
-        },
-        # Dummy borrowed books data
-        "borrowed_books": [
-            {
-                "id": 1,
-                "title": "Python Programming",
-                "borrow_date": "2024-02-01",
-                "due_date": "2024-02-15",
-                "status": "Active"
-            },
-            {
-                "id": 2,
-                "title": "Data Structures",
-                "borrow_date": "2024-01-20",
-                "due_date": "2024-02-03",
-                "status": "Overdue"
-            }
-        ],
-        # Dummy transaction history
-        "transactions": [
-            {
-                "id": 1,
-                "type": "Borrow",
-                "book_title": "Python Programming",
-                "date": "2024-02-01",
-                "fee": 150
-            },
-            {
-                "id": 2,
-                "type": "Return",
-                "book_title": "JavaScript Basics",
-                "date": "2024-01-25",
-                "fee": 0
-            }
-        ]
+        **detail,
+        "debt": detail["stats"]["fines_outstanding"],
+        "trans": detail["transactions"]
     }
     
     return templates.TemplateResponse("admin/member_detail.html", member_data)
@@ -158,108 +103,141 @@ async def admin_view_member_detail(
 @login_required
 async def admin_view_books(
     request: Request, 
-    current_user: dict = Depends(get_current_user)
+    q: str = "",
+    page: int = 1,
+    sort: str = "title",
+    cursor: Optional[str] = None,
+    format: str = "html",
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user["role"] != UserRole.ADMIN.value:
         return RedirectResponse(url="/", status_code=302)
-    
+
+    if q:
+        # Search results are ranked, so they page by rank instead of by key
+        page = max(page, 1)
+        books, has_next = await db.run_sync(search.search_books, q, page=page, per_page=BOOKS_PER_PAGE)
+        if format == "json":
+            return JSONResponse({"items": books, "q": q, "page": page, "has_next": has_next})
+        return conditional_response(
+            request,
+            lambda: templates.TemplateResponse("admin/books.html", {
+                "request": request,
+                "books": books,
+                "q": q,
+                "page": page,
+                "has_next": has_next
+            }),
+            etag=make_etag("admin/books", current_user["id"], books, has_next),
+            last_modified=catalog.last_modified(books),
+        )
+
+    try:
+        books, next_cursor = await catalog.cached_list_books(db, sort, cursor, BOOKS_PER_PAGE)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown sort '{sort}'")
+
+    if format == "json":
+        return JSONResponse({"items": books, "sort": sort, "next_cursor": next_cursor})
+
     books_data = {
         "request": request,
-        "total_books": 150,
-        "available_books": 120,
-        "borrowed_books": 30,
-        "books": [
-            {
-                "id": 1,
-                "title": "Python Programming",
-                "author": "John Smith",
-                "isbn": "978-1234567890",
-                "category": "Programming",
-                "status": "Available",
-                "copies": 5,
-                "available_copies": 3
-            },
-            {
-                "id": 2,
-                "title": "Data Science Basics",
-                "author": "Jane Doe",
-                "isbn": "978-0987654321",
-                "category": "Data Science",
-                "status": "Available",
-                "copies": 3,
-                "available_copies": 1
-            },
-            {
-                "id": 3,
-                "title": "Web Development",
-                "author": "Mike Johnson",
-                "isbn": "978-5432109876",
-                "category": "Programming",
-                "status": "All Borrowed",
-                "copies": 2,
-                "available_copies": 0
-            }
-        ]
+        "books": books,
+        "sort": sort,
+        "sorts": list(BOOK_SORTS),
+        "cursor": cursor,
+        "next_cursor": next_cursor
     }
-    return templates.TemplateResponse("admin/books.html", books_data)
+    return conditional_response(
+        request,
+        lambda: templates.TemplateResponse("admin/books.html", books_data),
+        etag=make_etag("admin/books", current_user["id"], books, next_cursor),
+        last_modified=catalog.last_modified(books),
+    )
 
 @router.get("/books/{book_id}", response_class=HTMLResponse)
 @login_required
 async def admin_view_book_detail(
     request: Request, 
     book_id: int, 
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.ADMIN.value:
+        return RedirectResponse(url="/", status_code=302)
+
+    detail = await db.run_sync(catalog.book_detail, book_id)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    last_modified = detail.pop("last_modified")
+    return conditional_response(
+        request,
+        lambda: templates.TemplateResponse("admin/book_detail.html", {"request": request, **detail}),
+        etag=make_etag("admin/book_detail", current_user["id"], detail),
+        last_modified=last_modified,
+    )
+
+@router.post("/loans/{loan_id}/return")
+@login_required
+async def admin_return_loan(
+    request: Request,
+    loan_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.ADMIN.value:
+        return RedirectResponse(url="/", status_code=302)
+    try:
+        book_id = await circulation.retry_on_deadlock_async(circulation.return_loan, db, loan_id)
+    except circulation.LoanNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return RedirectResponse(url=f"/admin/books/{book_id}", status_code=303)
+
+@router.get("/export/{kind}")
+@login_required
+async def admin_export(
+    request: Request,
+    kind: str,
+    format: str = "csv",
+    gzip: bool = False,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    status: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    # Streams straight from a server-side cursor, so exports of any size use flat memory
     if current_user["role"] != UserRole.ADMIN.value:
         return RedirectResponse(url="/", status_code=302)
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}'")
+    try:
+        query = exports.build_query(kind, start, end, status)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{kind}'")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    book_data = {
-        "request": request,
-        "book": {
-            "id": book_id,
-            "title": "Python Programming",
-            "author": "John Smith",
-            "isbn": "978-1234567890",
-            "publisher": "Tech Publications",
-            "publication_year": 2023,
-            "category": "Programming",
-            "description": "A comprehensive guide to Python programming language...",
-            "copies": 5,
-            "available_copies": 3,
-            "location": "Shelf A-12",
-            "price": 599,
-            "added_date": "2024-01-15"
-        },
-        "current_borrowers": [
-            {
-                "member_id": 1,
-                "name": "Alice Brown",
-                "borrow_date": "2024-02-01",
-                "due_date": "2024-02-15",
-                "status": "Active"
-            },
-            {
-                "member_id": 2,
-                "name": "Bob Wilson",
-                "borrow_date": "2024-01-25",
-                "due_date": "2024-02-08",
-                "status": "Overdue"
-            }
-        ],
-        "borrow_history": [
-            {
-                "member_name": "Charlie Davis",
-                "borrow_date": "2023-12-15",
-                "return_date": "2023-12-30",
-                "status": "Returned"
-            },
-            {
-                "member_name": "David Miller",
-                "borrow_date": "2023-11-20",
-                "return_date": "2023-12-05",
-                "status": "Returned"
-            }
-        ]
-    }
-    return templates.TemplateResponse("admin/book_detail.html", book_data)
+    filename = f"{kind}-{datetime.now():%Y%m%d-%H%M%S}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        exports.stream_export(query, format, compress=gzip),
+        media_type="application/gzip" if gzip else exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
+@router.get("/metrics")
+@login_required
+async def admin_metrics(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    # Per-route latency histograms, connection pool usage and this worker's
+    # event streams in the Prometheus text format
+    if current_user["role"] != UserRole.ADMIN.value:
+        return RedirectResponse(url="/", status_code=302)
+    return PlainTextResponse(
+        route_metrics.render() + pool.render() + notifications.hub.render(),
+        media_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,154 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import schemas
+from ..database.connection import get_async_db
+from ..database.models import BookLoan, BookLoanArchive, UserRole
+from ..routers.auth import get_current_user_from_token
+from ..services import api, stats
+from ..utils.pagination import InvalidCursor
+from ..utils.responses import FastJSONResponse
+
+# JSON API for kiosks and the mobile app. Clients authenticate with a bearer
+# token from POST /auth/token. Collections take ?fields= (sparse fieldsets),
+# ?ids= (batch GET) or ?cursor=&limit= (pages in id order). Handlers return
+# FastJSONResponse themselves: a returned dict would go through
+# jsonable_encoder first
+router = APIRouter(
+    prefix="/api/v1",
+    tags=["api"],
+    default_response_class=FastJSONResponse,
+    dependencies=[Depends(get_current_user_from_token)],
+)
+
+def _require_admin(current_user: dict):
+    if current_user["role"] != UserRole.ADMIN.value:
+        raise HTTPException(status_code=403, detail="Admins only")
+
+async def _collection(db: AsyncSession, resource, fields, ids, cursor, limit, conditions=()):
+    try:
+        selected = resource.parse_fields(fields)
+        if ids is not None:
+            data = await db.run_sync(api.fetch_many, resource, selected, api.parse_ids(ids), conditions)
+            return FastJSONResponse({"data": data})
+        data, next_cursor = await db.run_sync(api.fetch_page, resource, selected, cursor, limit, conditions)
+    except (api.InvalidRequest, InvalidCursor) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({"data": data, "next_cursor": next_cursor})
+
+async def _item(db: AsyncSession, resource, item_id: int, fields, conditions=()):
+    try:
+        selected = resource.parse_fields(fields)
+    except api.InvalidRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    data = await db.run_sync(api.fetch_many, resource, selected, [item_id], conditions)
+    if not data:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FastJSONResponse({"data": data[0]})
+
+@router.get("/books")
+async def list_books(
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _collection(db, api.BOOKS, fields, ids, cursor, limit)
+
+@router.get("/books/{book_id}")
+async def get_book(
+    book_id: int,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _item(db, api.BOOKS, book_id, fields)
+
+def _loan_conditions(current_user: dict, archived: bool, user_id=None, book_id=None, open_only=None) -> tuple:
+    """Resource and filters of a loan request; members only ever see their own loans"""
+    resource, loans = (api.ARCHIVED_LOANS, BookLoanArchive) if archived else (api.LOANS, BookLoan)
+    conditions = []
+    if current_user["role"] != UserRole.ADMIN.value:
+        user_id = current_user["id"]
+    if user_id is not None:
+        conditions.append(loans.user_id == user_id)
+    if book_id is not None:
+        conditions.append(loans.book_id == book_id)
+    if open_only is not None:
+        conditions.append(loans.is_returned.is_(not open_only))
+    return resource, conditions
+
+@router.get("/loans")
+async def list_loans(
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    user_id: Optional[int] = None,
+    book_id: Optional[int] = None,
+    open: Optional[bool] = None,
+    archived: bool = False,
+    current_user: dict = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Loans moved to the archive are listed with ?archived=true
+    resource, conditions = _loan_conditions(current_user, archived, user_id, book_id, open)
+    return await _collection(db, resource, fields, ids, cursor, limit, conditions)
+
+@router.get("/loans/{loan_id}")
+async def get_loan(
+    loan_id: int,
+    fields: Optional[str] = None,
+    archived: bool = False,
+    current_user: dict = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_async_db)
+):
+    resource, conditions = _loan_conditions(current_user, archived)
+    return await _item(db, resource, loan_id, fields, conditions)
+
+@router.get("/members")
+async def list_members(
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    current_user: dict = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _require_admin(current_user)
+    return await _collection(db, api.MEMBERS, fields, ids, cursor, limit)
+
+@router.get("/members/me")
+async def get_own_member(
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        raise HTTPException(status_code=403, detail="Only members have a member record")
+    return await _item(db, api.MEMBERS, current_user["id"], fields)
+
+@router.get("/members/{member_id}")
+async def get_member(
+    member_id: int,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if member_id != current_user["id"]:
+        _require_admin(current_user)
+    return await _item(db, api.MEMBERS, member_id, fields)
+
+@router.get("/stats")
+async def get_stats(
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _require_admin(current_user)
+    try:
+        selected = api.parse_fields(api.STATS_FIELDS, fields)
+    except api.InvalidRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    counters = schemas.LibraryStats(**await db.run_sync(stats.get_counters))
+    return FastJSONResponse({"data": counters.model_dump(include=set(selected))})
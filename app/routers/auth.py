@@ -1,19 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from ..database.connection import get_db
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select
+from ..database.connection import get_async_db
 from ..database.models import User, UserRole
-from ..utils.auth import get_password_hash, verify_password, create_access_token
+from ..utils.auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    PasswordHasherBusy,
+    create_access_token,
+    decode_access_token,
+    hash_password_async,
+    verify_and_update_password
+)
+from ..templating import templates
 
 router = APIRouter(prefix="/auth", tags=["auth"])
-templates = Jinja2Templates(directory="templates")
+bearer_scheme = HTTPBearer(auto_error=False)
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+    if not user:
+        return None
+    valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 async def get_current_user(request: Request):
@@ -26,6 +41,31 @@ async def get_current_user(request: Request):
         )
     return user
 
+async def get_current_user_from_token(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
+):
+    """Authenticate API clients (kiosks, mobile app) by `Authorization: Bearer`.
+
+    Returns the same shape as get_current_user, taken from the token claims.
+    """
+    unauthorized = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or missing bearer token",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+    if credentials is None:
+        raise unauthorized
+    try:
+        claims = decode_access_token(credentials.credentials)
+    except JWTError:
+        raise unauthorized
+    return {
+        "id": int(claims["sub"]),
+        "email": claims.get("email"),
+        "username": claims.get("username"),
+        "role": claims.get("role")
+    }
+
 @router.get("/signup", response_class=HTMLResponse)
 async def signup_page(request: Request):
     return templates.TemplateResponse(
@@ -39,12 +79,12 @@ async def signup(
     email: str = Form(...),
     username: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Check if user exists
-    existing_user = db.query(User).filter(
-        (User.email == email) | (User.username == username)
-    ).first()
+    existing_user = (await db.execute(
+        select(User).where((User.email == email) | (User.username == username))
+    )).scalars().first()
     
     if existing_user:
         return templates.TemplateResponse(
@@ -58,7 +98,20 @@ async def signup(
         )
     
     # Create new user
-    hashed_password = get_password_hash(password)
+    try:
+        hashed_password = await hash_password_async(password)
+    except PasswordHasherBusy:
+        return templates.TemplateResponse(
+            "auth/signup.html",
+            {
+                "request": request,
+                "error": "The server is busy. Please try again in a moment.",
+                "username": username,
+                "email": email
+            },
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"}
+        )
     db_user = User(
         username=username,
         email=email,
@@ -67,14 +120,14 @@ async def signup(
     
     try:
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return RedirectResponse(
             url="/auth/login?success=Account created successfully! Please login.",
             status_code=303
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return templates.TemplateResponse(
             "auth/signup.html",
             {
@@ -97,16 +150,18 @@ async def login(
     request: Request,
     username_or_email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Check if login is with email or username
-        user = db.query(User).filter(
-            or_(
-                User.email == username_or_email,
-                User.username == username_or_email
+        user = (await db.execute(
+            select(User).where(
+                or_(
+                    User.email == username_or_email,
+                    User.username == username_or_email
+                )
             )
-        ).first()
+        )).scalars().first()
 
         if not user:
             return templates.TemplateResponse(
@@ -118,7 +173,8 @@ async def login(
                 }
             )
         
-        if not verify_password(password, user.hashed_password):
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+        if not valid:
             return templates.TemplateResponse(
                 "auth/login.html",
                 {
@@ -128,6 +184,11 @@ async def login(
                 }
             )
 
+        if new_hash:
+            # Stored hash used an outdated bcrypt cost
+            user.hashed_password = new_hash
+            await db.commit()
+
         request.session["user"] = {
             "id": user.id,
             "email": user.email,
@@ -137,7 +198,18 @@ async def login(
         
         # Redirect based on user role
         return RedirectResponse(url="/", status_code=303)
-        
+
+    except PasswordHasherBusy:
+        return templates.TemplateResponse(
+            "auth/login.html",
+            {
+                "request": request,
+                "error": "The server is busy. Please try again in a moment.",
+                "username_or_email": username_or_email
+            },
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         return templates.TemplateResponse(
             "auth/login.html",
@@ -148,6 +220,49 @@ async def login(
             }
         )
 
+@router.post("/token")
+async def issue_token(
+    username: str = Form(...),
+    password: str = Form(...),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """OAuth2 password grant: exchange credentials for a bearer token"""
+    user = (await db.execute(
+        select(User).where(or_(User.email == username, User.username == username))
+    )).scalars().first()
+    invalid = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Incorrect username or password",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+    if not user or user.is_deleted:
+        raise invalid
+    try:
+        valid, new_hash = await verify_and_update_password(password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    if not valid:
+        raise invalid
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    access_token = create_access_token({
+        "sub": str(user.id),
+        "email": user.email,
+        "username": user.username,
+        "role": user.role.value
+    })
+    return JSONResponse({
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    })
+
 @router.get("/logout")
 async def logout(request: Request):
     # Xóa session khi logout
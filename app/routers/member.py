@@ -1,71 +1,216 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from typing import List, Optional
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database.connection import get_async_db
 from ..database.schemas import UserRole
 from ..routers.auth import get_current_user
+from ..services import circulation, members, notifications, search
+from ..services import catalog
+from ..services.catalog import BOOK_SORTS
+from ..templating import templates
 from ..utils.auth import login_required
+from ..utils.conditional import conditional_response, make_etag
+from ..utils.pagination import InvalidCursor
 
 router = APIRouter(prefix="/member", tags=["member"])
-templates = Jinja2Templates(directory="templates")
+
+BOOKS_PER_PAGE = 20
 
 @router.get("/dashboard", response_class=HTMLResponse)
 @login_required
 async def member_dashboard(
     request: Request,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user["role"] != UserRole.MEMBER.value:
         return RedirectResponse(url="/", status_code=303)
-    # Dummy data cho dashboard của member
+
     dashboard_data = {
         "request": request,
-        "borrowed_books": [
-            {
-                "id": 1,
-                "title": "Python Programming",
-                "author": "John Smith",
-                "borrow_date": "2024-02-01",
-                "due_date": "2024-02-15",
-                "status": "Active"
-            },
-            {
-                "id": 2,
-                "title": "Data Structures",
-                "author": "Jane Doe",
-                "borrow_date": "2024-01-20",
-                "due_date": "2024-02-03",
-                "status": "Overdue"
-            }
-        ],
-        "favorite_books": [
-            {
-                "id": 1,
-                "title": "Machine Learning Basics",
-                "author": "Mike Wilson",
-                "category": "Data Science",
-                "available": True
-            },
-            {
-                "id": 2,
-                "title": "Web Development",
-                "author": "Sarah Brown",
-                "category": "Programming",
-                "available": False
-            },
-            {
-                "id": 3,
-                "title": "Database Design",
-                "author": "Tom Davis",
-                "category": "Database",
-                "available": True
-            }
-        ],
-        "stats": {
-            "total_borrowed": 2,
-            "total_favorites": 3,
-            "overdue_books": 1,
-            "total_rent_fee": 100
-        }
+        **await db.run_sync(members.member_dashboard, current_user["id"])
     }
     
-    return templates.TemplateResponse("member/dashboard.html", dashboard_data)
\ No newline at end of file
+    return templates.TemplateResponse("member/dashboard.html", dashboard_data)
+
+@router.get("/events")
+@login_required
+async def member_events(
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    # Server-Sent Events: ready holds and loans coming due, pushed as they
+    # happen. No database session: the worker's event source polls for everyone
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+    hub = notifications.hub
+    if hub.full():
+        hub.rejected += 1
+        raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        hub.stream(current_user["id"]),
+        media_type="text/event-stream",
+        # No-buffering hint for nginx in front of the app
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/books", response_class=HTMLResponse)
+@login_required
+async def member_view_books(
+    request: Request,
+    q: str = "",
+    page: int = 1,
+    sort: str = "title",
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+
+    if q:
+        page = max(page, 1)
+        books, has_next = await db.run_sync(search.search_books, q, page=page, per_page=BOOKS_PER_PAGE)
+        context = {"q": q, "page": page, "has_next": has_next}
+    else:
+        try:
+            books, next_cursor = await catalog.cached_list_books(db, sort, cursor, BOOKS_PER_PAGE)
+        except (KeyError, InvalidCursor):
+            raise HTTPException(status_code=400, detail="Invalid sort or cursor")
+        context = {"sort": sort, "sorts": list(BOOK_SORTS), "cursor": cursor, "next_cursor": next_cursor}
+
+    return conditional_response(
+        request,
+        lambda: templates.TemplateResponse("member/books.html", {
+            "request": request,
+            "books": books,
+            **context
+        }),
+        etag=make_etag("member/books", current_user["id"], books, context),
+        last_modified=catalog.last_modified(books),
+    )
+
+@router.get("/books/autocomplete")
+@login_required
+async def books_autocomplete(
+    request: Request,
+    q: str = "",
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Shared by the member and admin catalog search boxes
+    return await db.run_sync(search.autocomplete, q)
+
+@router.get("/books/{book_id}", response_class=HTMLResponse)
+@login_required
+async def member_view_book_detail(
+    request: Request,
+    book_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+
+    # Members only see their own loans of the book
+    detail = await db.run_sync(catalog.book_detail, book_id, current_user["id"])
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    last_modified = detail.pop("last_modified")
+    return conditional_response(
+        request,
+        lambda: templates.TemplateResponse("member/book_detail.html", {"request": request, **detail}),
+        etag=make_etag("member/book_detail", current_user["id"], detail),
+        last_modified=last_modified,
+    )
+
+def _books_redirect(success: str = None, error: str = None) -> RedirectResponse:
+    message = f"success={quote(success)}" if success else f"error={quote(error)}"
+    return RedirectResponse(url=f"/member/books?{message}", status_code=303)
+
+async def _checkout(db: AsyncSession, user_id: int, book_ids: List[int]) -> RedirectResponse:
+    try:
+        await circulation.retry_on_deadlock_async(circulation.checkout_books, db, user_id, book_ids)
+    except circulation.CirculationError as e:
+        return _books_redirect(error=str(e))
+    count = len(set(book_ids))
+    return _books_redirect(success=f"Borrowed {count} book{'s' if count > 1 else ''}.")
+
+@router.post("/books/{book_id}/borrow")
+@login_required
+async def borrow_book(
+    request: Request,
+    book_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+    return await _checkout(db, current_user["id"], [book_id])
+
+@router.post("/checkout")
+@login_required
+async def checkout_books(
+    request: Request,
+    book_ids: List[int] = Form(...),
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Self-checkout of several books at once: all are lent or none is
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+    return await _checkout(db, current_user["id"], book_ids)
+
+@router.post("/loans/{loan_id}/return")
+@login_required
+async def return_book(
+    request: Request,
+    loan_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+    try:
+        await circulation.retry_on_deadlock_async(
+            circulation.return_loan, db, loan_id, user_id=current_user["id"]
+        )
+    except circulation.CirculationError as e:
+        return RedirectResponse(url=f"/member/dashboard?error={quote(str(e))}", status_code=303)
+    return RedirectResponse(url="/member/dashboard?success=Book%20returned.", status_code=303)
+
+@router.post("/books/{book_id}/reserve")
+@login_required
+async def reserve_book(
+    request: Request,
+    book_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+    try:
+        await circulation.retry_on_deadlock_async(circulation.place_hold, db, current_user["id"], book_id)
+    except circulation.CirculationError as e:
+        return _books_redirect(error=str(e))
+    return RedirectResponse(url="/member/dashboard?success=Book%20reserved.", status_code=303)
+
+@router.post("/reservations/{reservation_id}/cancel")
+@login_required
+async def cancel_reservation(
+    request: Request,
+    reservation_id: int,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if current_user["role"] != UserRole.MEMBER.value:
+        return RedirectResponse(url="/", status_code=303)
+    try:
+        await circulation.retry_on_deadlock_async(
+            circulation.cancel_hold, db, reservation_id, user_id=current_user["id"]
+        )
+    except circulation.CirculationError as e:
+        return RedirectResponse(url=f"/member/dashboard?error={quote(str(e))}", status_code=303)
+    return RedirectResponse(url="/member/dashboard?success=Reservation%20cancelled.", status_code=303)
@@ -0,0 +1,98 @@
+import os
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..database import schemas
+from ..database.models import Book, BookLoan, BookLoanArchive, Category, User, UserRole
+from ..utils.pagination import decode_cursor, encode_cursor
+
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "100"))
+# Most ids one batch GET may ask for
+API_MAX_BATCH = int(os.getenv("API_MAX_BATCH", "500"))
+
+class InvalidRequest(ValueError):
+    """Raised for an unknown field, a malformed id list or an oversized batch"""
+
+def parse_fields(available: list, fields: str = None, always=()) -> list:
+    """Names from a `?fields=` value, in the order of `available`; all of them when it is empty"""
+    if not fields:
+        return available
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(available)
+    if unknown:
+        raise InvalidRequest(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [name for name in available if name in requested or name in always]
+
+class Resource:
+    """A JSON API collection: the fields of its schema and the columns they are read from.
+
+    Only the requested fields are selected, and a join is only added when
+    a requested field needs it, so a client asking for ids and titles
+    reads and serializes nothing else.
+    """
+
+    def __init__(self, schema, id_column, columns: dict, conditions=(), joins: dict = None):
+        self.fields = list(schema.model_fields)
+        self.id_column = id_column
+        model = id_column.class_
+        self.columns = {name: columns[name] if name in columns else getattr(model, name) for name in self.fields}
+        self.conditions = list(conditions)
+        # field -> (target, onclause) outer joined when the field is requested
+        self.joins = joins or {}
+
+    def parse_fields(self, fields: str = None) -> list:
+        """Field names from a `?fields=` value, in schema order; all of them when it is empty"""
+        return parse_fields(self.fields, fields, always=("id",))
+
+    def select(self, fields: list, conditions=()):
+        query = select(*(self.columns[name].label(name) for name in fields)).select_from(self.id_column.class_)
+        for name in fields:
+            if name in self.joins:
+                query = query.outerjoin(*self.joins[name])
+        return query.where(*self.conditions, *conditions)
+
+BOOKS = Resource(
+    schemas.Book, Book.id, {"category": Category.name},
+    conditions=[Book.is_deleted.is_(False)],
+    joins={"category": (Category, Book.category_id == Category.id)},
+)
+LOANS = Resource(schemas.Loan, BookLoan.id, {}, conditions=[BookLoan.is_deleted.is_(False)])
+ARCHIVED_LOANS = Resource(schemas.Loan, BookLoanArchive.id, {}, conditions=[BookLoanArchive.is_deleted.is_(False)])
+MEMBERS = Resource(
+    schemas.Member, User.id, {},
+    conditions=[User.role == UserRole.MEMBER, User.is_deleted.is_(False)],
+)
+# The dashboard counters, served whole rather than as rows
+STATS_FIELDS = list(schemas.LibraryStats.model_fields)
+
+def parse_ids(ids: str) -> list:
+    """Distinct ids from a comma-separated `?ids=` value, in the order given"""
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise InvalidRequest("ids must be comma-separated integers")
+    if len(parsed) > API_MAX_BATCH:
+        raise InvalidRequest(f"At most {API_MAX_BATCH} ids per request")
+    return parsed
+
+def fetch_many(db: Session, resource: Resource, fields: list, ids: list, conditions=()) -> list:
+    """Batch GET: the rows with these ids, in the order asked for; ids not found are left out"""
+    if not ids:
+        return []
+    rows = db.execute(resource.select(fields, [resource.id_column.in_(ids), *conditions])).mappings()
+    by_id = {row["id"]: dict(row) for row in rows}
+    return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+def fetch_page(db: Session, resource: Resource, fields: list, cursor: str = None, limit: int = None,
+               conditions=()):
+    """One page in id order and the cursor of the next, by keyset on the primary key"""
+    limit = max(1, min(limit or API_PAGE_SIZE, API_PAGE_SIZE))
+    query = resource.select(fields, conditions)
+    if cursor:
+        _, last_id = decode_cursor(cursor, "id")
+        query = query.where(resource.id_column > last_id)
+    rows = [dict(row) for row in db.execute(query.order_by(resource.id_column).limit(limit + 1)).mappings()]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor("id", rows[-1]["id"], rows[-1]["id"])
+    return rows, next_cursor
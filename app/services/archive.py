@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+import logging
+import os
+from sqlalchemy import DateTime, and_, delete, exists, insert, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+from ..database.connection import SessionLocal
+from ..database.models import BookLoan, BookLoanArchive, Fine, utcnow
+from ..utils.fragment_cache import fragment_cache
+
+logger = logging.getLogger(__name__)
+
+# Returned loans borrowed more than this many days ago leave book_loans
+LOAN_ARCHIVE_AFTER_DAYS = int(os.getenv("LOAN_ARCHIVE_AFTER_DAYS", "365"))
+LOAN_ARCHIVE_BATCH_SIZE = int(os.getenv("LOAN_ARCHIVE_BATCH_SIZE", "1000"))
+
+# Columns the two loan tables share; the archive adds archived_at
+LOAN_COLUMNS = (
+    "id", "user_id", "book_id", "borrowed_date", "due_date", "returned_date",
+    "fine_amount", "is_returned", "created_at", "updated_at", "is_deleted",
+)
+
+def loan_history(conditions, order_by=None, limit: int = None):
+    """Loans from book_loans and book_loans_archive as one UNION ALL select.
+
+    `conditions(table)` returns the filters for either table (BookLoan or
+    BookLoanArchive). With `order_by(table)` and `limit`, each side is read
+    in index order and cut to `limit` rows, so a "latest N" page reads at
+    most 2 * N rows; the caller merges the two sides.
+    """
+    def side(table):
+        query = select(*(getattr(table, name) for name in LOAN_COLUMNS)).where(*conditions(table))
+        if order_by is not None:
+            query = query.order_by(*order_by(table))
+        if limit is not None:
+            # SQLite only accepts ORDER BY/LIMIT inside a compound through a subquery
+            query = select(query.limit(limit).subquery())
+        return query
+
+    return union_all(side(BookLoan), side(BookLoanArchive))
+
+def archivable(cutoff: datetime) -> list:
+    """Returned loans borrowed before `cutoff`; loans with fines stay, as fines reference them"""
+    return [
+        BookLoan.borrowed_date < cutoff,
+        BookLoan.is_returned.is_(True),
+        ~exists().where(Fine.loan_id == BookLoan.id),
+    ]
+
+def archive_loans(db: Session, now: datetime = None, older_than_days: int = None, batch_size: int = None) -> dict:
+    """Move old returned loans from book_loans to book_loans_archive.
+
+    Walks candidates in (borrowed_date, id) order and moves each batch of
+    `batch_size` with an INSERT ... SELECT and a DELETE in one short
+    transaction, so the app can keep serving while it runs and every loan
+    is in exactly one of the two tables. Loans keep their ids. Running it
+    again only moves loans that have aged past the cutoff since.
+    """
+    now = now or utcnow()
+    days = LOAN_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or LOAN_ARCHIVE_BATCH_SIZE
+    conditions = archivable(now - timedelta(days=days))
+    totals = {"loans_archived": 0, "batches": 0}
+    last = None
+    try:
+        while True:
+            conn = db.connection()
+            query = select(BookLoan.id, BookLoan.borrowed_date).where(*conditions)
+            if last is not None:
+                query = query.where(or_(
+                    BookLoan.borrowed_date > last.borrowed_date,
+                    and_(BookLoan.borrowed_date == last.borrowed_date, BookLoan.id > last.id),
+                ))
+            rows = conn.execute(
+                query.order_by(BookLoan.borrowed_date, BookLoan.id).limit(batch_size).with_for_update()
+            ).all()
+            if not rows:
+                break
+            loan_ids = [row.id for row in rows]
+            conn.execute(insert(BookLoanArchive).from_select(
+                [*LOAN_COLUMNS, "archived_at"],
+                select(*(getattr(BookLoan, name) for name in LOAN_COLUMNS), literal(now, DateTime))
+                .where(BookLoan.id.in_(loan_ids)),
+            ))
+            conn.execute(delete(BookLoan).where(BookLoan.id.in_(loan_ids)))
+            db.commit()
+            totals["loans_archived"] += len(loan_ids)
+            totals["batches"] += 1
+            last = rows[-1]
+    except Exception:
+        db.rollback()
+        raise
+    if totals["loans_archived"]:
+        fragment_cache.invalidate("loans")
+    return totals
+
+def archive_loans_job():
+    """Periodic entry point: archive old loans in a session of its own"""
+    db = SessionLocal()
+    try:
+        totals = archive_loans(db)
+        logger.info("Archived loans: %s", totals)
+    finally:
+        db.close()
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+from sqlalchemy import delete, event, insert, inspect, select
+from sqlalchemy.orm import Session
+from ..database.connection import get_async_engine, get_engine
+from ..database.models import Book, BookAvailabilityChange, utcnow
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "100000"))
+# Seconds between polls of the change log; bounds how stale another
+# worker's checkouts and returns can look
+AVAILABILITY_POLL_INTERVAL = float(os.getenv("AVAILABILITY_POLL_INTERVAL", "0.05"))
+# Seconds of change log kept for workers that fall behind
+AVAILABILITY_CHANGE_RETENTION = float(os.getenv("AVAILABILITY_CHANGE_RETENTION", "600"))
+# Changes are re-read this long after their timestamp, since a transaction
+# can commit after a later one (and worker clocks differ slightly)
+COMMIT_SLACK = timedelta(seconds=5)
+# Without a poll for this long the cache is bypassed rather than trusted
+MAX_SYNC_AGE = max(1.0, 4 * AVAILABILITY_POLL_INTERVAL)
+
+class AvailabilityCache:
+    """Bounded LRU of book id -> (available copies, total copies).
+
+    Each entry is one int (available << 32 | total). Circulation writes
+    update it in place (write-through); changes made by other workers
+    arrive through the book_availability_changes log, which sync() polls
+    and evicts from. Until the log has been polled recently, reads go to
+    the database, so a worker without a running poller never serves stale
+    counts.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every eviction; fills read before an eviction are dropped
+        self._generation = 0
+        self._polled_at = None
+        self._seen = set()
+        self._synced_at = None
+
+    def fresh(self) -> bool:
+        return self._synced_at is not None and time.monotonic() - self._synced_at < MAX_SYNC_AGE
+
+    async def get_many(self, book_ids) -> dict:
+        """book id -> (available, total) for the ids that exist; misses cost one query"""
+        found, missing = {}, []
+        fresh = self.fresh()
+        with self._lock:
+            generation = self._generation
+            for book_id in book_ids:
+                packed = self._entries.get(book_id) if fresh else None
+                if packed is None:
+                    missing.append(book_id)
+                else:
+                    self._entries.move_to_end(book_id)
+                    found[book_id] = (packed >> 32, packed & 0xFFFFFFFF)
+        if missing:
+            # The primary, in a transaction of its own: a replica or an older
+            # snapshot could hand back counts the log has already expired
+            async with get_async_engine().connect() as conn:
+                rows = (await conn.execute(
+                    select(Book.id, Book.available_copies, Book.total_copies)
+                    .where(Book.id.in_(missing), Book.is_deleted.is_(False))
+                )).all()
+            with self._lock:
+                for book_id, available, total in rows:
+                    found[book_id] = (available or 0, total or 0)
+                    if generation == self._generation:
+                        self._store(book_id, available or 0, total or 0)
+        return found
+
+    def _store(self, book_id: int, available: int, total: int):
+        self._entries[book_id] = available << 32 | total
+        self._entries.move_to_end(book_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def adjust(self, book_ids, delta: int):
+        """Write-through after a committed checkout (-1) or return (+1)"""
+        with self._lock:
+            for book_id in book_ids:
+                packed = self._entries.get(book_id)
+                if packed is not None:
+                    self._store(book_id, max((packed >> 32) + delta, 0), packed & 0xFFFFFFFF)
+
+    def evict(self, book_ids):
+        with self._lock:
+            self._generation += 1
+            for book_id in book_ids:
+                self._entries.pop(book_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def sync(self, conn) -> int:
+        """Evict books changed since the last poll; returns how many were evicted"""
+        now = utcnow()
+        new = set()
+        if self._polled_at is None or now - self._polled_at > timedelta(seconds=AVAILABILITY_CHANGE_RETENTION):
+            # First poll, or so long since the last one that the log may have been pruned
+            self.clear()
+            self._seen = set()
+        else:
+            rows = conn.execute(
+                select(BookAvailabilityChange.id, BookAvailabilityChange.book_id)
+                .where(BookAvailabilityChange.changed_at >= self._polled_at - COMMIT_SLACK)
+            ).all()
+            new = {row.book_id for row in rows if row.id not in self._seen}
+            if new:
+                self.evict(new)
+            # Only rows still inside the re-read window need remembering
+            self._seen = {row.id for row in rows}
+        self._polled_at = now
+        self._synced_at = time.monotonic()
+        return len(new)
+
+availability_cache = AvailabilityCache(AVAILABILITY_CACHE_SIZE)
+
+def record_changes(conn, book_ids, now: datetime = None):
+    """Log a change to the copies of `book_ids`, in the transaction that makes it"""
+    now = now or utcnow()
+    book_ids = sorted(set(book_ids))
+    if book_ids:
+        conn.execute(insert(BookAvailabilityChange), [{"book_id": book_id, "changed_at": now} for book_id in book_ids])
+
+async def overlay(books) -> list:
+    """Copies of listing cards with their copies and status from the cache"""
+    counts = await availability_cache.get_many([book["id"] for book in books])
+    cards = []
+    for book in books:
+        available, total = counts.get(book["id"], (book["available_copies"], book["copies"]))
+        cards.append({
+            **book,
+            "copies": total,
+            "available_copies": available,
+            "status": "Available" if available else "All Borrowed",
+        })
+    return cards
+
+def sync_job():
+    """Periodic entry point: apply the change log to this worker's cache"""
+    with get_engine().connect() as conn:
+        availability_cache.sync(conn)
+
+def prune_changes_job():
+    """Periodic entry point: drop change log rows every worker has read by now"""
+    cutoff = utcnow() - timedelta(seconds=AVAILABILITY_CHANGE_RETENTION)
+    with get_engine().begin() as conn:
+        deleted = conn.execute(delete(BookAvailabilityChange).where(BookAvailabilityChange.changed_at < cutoff))
+    if deleted.rowcount:
+        logger.info("Pruned %s book availability changes", deleted.rowcount)
+
+@event.listens_for(Session, "after_flush")
+def _log_book_changes(session, flush_context):
+    # ORM edits of a book's copies (the admin book form, ...); circulation
+    # writes with Core statements and logs its changes itself
+    changed = [obj.id for obj in session.deleted if isinstance(obj, Book)]
+    changed.extend(
+        obj.id for obj in session.dirty
+        if isinstance(obj, Book) and any(
+            inspect(obj).attrs[attr].history.has_changes() for attr in ("available_copies", "total_copies", "is_deleted")
+        )
+    )
+    if changed:
+        record_changes(session.connection(), changed)
+        availability_cache.evict(changed)
@@ -0,0 +1,137 @@
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..database.models import Book, Category
+from ..utils.fragment_cache import fragment_cache
+from ..utils.pagination import keyset_paginate
+from .archive import loan_history
+from .availability import overlay
+from .circulation import book_queue, member_holds
+from .recommendations import similar_books_index
+
+# Catalog listing sorts: query value -> (column, descending)
+BOOK_SORTS = {
+    "title": (Book.title, False),
+    "author": (Book.author, False),
+    "created_at": (Book.created_at, True),
+    "availability": (Book.available_copies, True),
+}
+
+def book_card(book: Book, category_name) -> dict:
+    """Template-friendly view of a book listing row"""
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "isbn": book.isbn,
+        "publisher": book.publisher,
+        "category": category_name,
+        "status": "Available" if book.available_copies else "All Borrowed",
+        "copies": book.total_copies,
+        "available_copies": book.available_copies,
+        "updated_at": book.updated_at.isoformat(),
+    }
+
+def list_books(db: Session, sort: str = "title", cursor: str = None, limit: int = 20):
+    """One keyset page of the catalog; returns (books, next_cursor).
+
+    Raises KeyError for an unknown sort and InvalidCursor for a bad cursor.
+    """
+    column, descending = BOOK_SORTS[sort]
+    query = (
+        db.query(Book, Category.name)
+        .outerjoin(Category, Book.category_id == Category.id)
+        .filter(Book.is_deleted.is_(False))
+    )
+    rows, next_cursor = keyset_paginate(
+        query, sort, column, Book.id, cursor, limit, descending,
+        key=lambda row: (getattr(row[0], column.key), row[0].id)
+    )
+    return [book_card(book, category) for book, category in rows], next_cursor
+
+async def cached_list_books(db: AsyncSession, sort: str = "title", cursor: str = None, limit: int = 20):
+    """list_books from the fragment cache, with copies from the availability cache.
+
+    Pages cached under "books" only go stale when books or categories are
+    edited; checkouts and returns reach them through the availability
+    cache. Pages sorted by availability are always read afresh, since
+    their order is what circulation changes.
+    """
+    if sort == "availability":
+        return await db.run_sync(list_books, sort, cursor, limit)
+    books, next_cursor = await db.run_sync(lambda session: fragment_cache.get_or_render(
+        ["books", "page", sort, cursor, limit], None, lambda: list_books(session, sort, cursor, limit)
+    ))
+    # Misses are read on the async engine, outside run_sync, so they never block the loop
+    return await overlay(books), next_cursor
+
+def last_modified(books):
+    """Latest change among listing rows, for Last-Modified"""
+    return max((datetime.fromisoformat(book["updated_at"]) for book in books), default=None)
+
+# Most recent loans listed on a book's detail page
+BOOK_HISTORY_LIMIT = 50
+
+def book_detail(db: Session, book_id: int, user_id: int = None):
+    """A book with its stock, latest loans and holds, or None if there is no such book.
+
+    Pass `user_id` to list only that member's loans and their own hold;
+    without it the book's queue is listed. `last_modified` is the latest
+    change to the book or to any of its loans.
+    """
+    row = (
+        db.query(Book, Category.name)
+        .outerjoin(Category, Book.category_id == Category.id)
+        .filter(Book.id == book_id, Book.is_deleted.is_(False))
+        .first()
+    )
+    if row is None:
+        return None
+    book, category = row
+
+    def conditions(loans):
+        # Archived loans count too: the history reads as one table
+        found = [loans.book_id == book_id, loans.is_deleted.is_(False)]
+        if user_id is not None:
+            found.append(loans.user_id == user_id)
+        return found
+
+    history = loan_history(conditions).subquery()
+    total_borrowed, loans_changed = db.query(func.count(history.c.id), func.max(history.c.updated_at)).one()
+    newest_first = lambda loans: (loans.borrowed_date.desc(), loans.id.desc())
+    latest = db.execute(loan_history(conditions, newest_first, BOOK_HISTORY_LIMIT)).all()
+    recent = sorted(latest, key=lambda loan: (loan.borrowed_date, loan.id), reverse=True)[:BOOK_HISTORY_LIMIT]
+    if user_id is not None:
+        holds = member_holds(db, user_id, book_id)
+        reservations = {"hold": holds[0] if holds else None}
+    else:
+        reservations = {"queue": book_queue(db, book_id, BOOK_HISTORY_LIMIT)}
+    return {
+        "book": {
+            **book_card(book, category),
+            "publication_year": book.publication_year,
+        },
+        "stock": {
+            "total_quantity": book.total_copies,
+            "available_quantity": book.available_copies,
+            "borrowed_quantity": (book.total_copies or 0) - (book.available_copies or 0),
+            "total_borrowed": total_borrowed,
+        },
+        "trans": [
+            {
+                "id": loan.id,
+                "member_id": loan.user_id,
+                "issue_date": loan.borrowed_date,
+                "due_date": loan.due_date,
+                "return_date": loan.returned_date,
+                "is_returned": loan.is_returned,
+                "rent_fee": loan.fine_amount,
+            }
+            for loan in recent
+        ],
+        **reservations,
+        # Precomputed by build_recommendations.py; a lookup in memory, no SQL
+        "similar": similar_books_index.similar(book_id),
+        "last_modified": max(filter(None, (book.updated_at, loans_changed))),
+    }
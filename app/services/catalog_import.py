@@ -0,0 +1,341 @@
+from collections import deque
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+from ..database.connection import SQLALCHEMY_DATABASE_URL
+from ..database.models import Book, Category, utcnow
+from ..database.upsert import upsert
+from ..utils.fragment_cache import fragment_cache
+from . import search, stats
+from .circulation import retry_on_deadlock
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 2000
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".mrc": "marc", ".marc": "marc"}
+# Source column names accepted for each record field
+_FIELD_ALIASES = {
+    "isbn": ("isbn", "isbn13", "isbn_13", "isbn10", "isbn_10"),
+    "title": ("title",),
+    "author": ("author", "authors"),
+    "publisher": ("publisher",),
+    "publication_year": ("publication_year", "year"),
+    "category": ("category", "category_name", "subject"),
+    "copies": ("copies", "total_copies"),
+}
+# Book columns refreshed when an imported ISBN already exists; copy counts
+# are left alone so reimports never disturb circulation
+_UPDATED_COLUMNS = ("title", "author", "publisher", "publication_year", "category_id", "updated_at")
+_ISBN_RE = re.compile(r"^(\d{9}[\dX]|\d{13})$")
+_YEAR_RE = re.compile(r"\d{4}")
+
+class ImportFormatError(ValueError):
+    """Raised when a source file cannot be parsed at all"""
+
+def detect_format(path: str) -> str:
+    try:
+        return FORMATS[os.path.splitext(path)[1].lower()]
+    except KeyError:
+        raise ImportFormatError(f"Cannot tell the format of {path}; pass it explicitly")
+
+# Readers stream (raw record, offset after the record) pairs so an import
+# can resume from the last committed offset
+
+def read_csv(path: str, offset: int = 0):
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8-sig")]), None)
+        if not header:
+            return
+        if offset:
+            f.seek(offset)
+        position = f.tell()
+
+        def lines():
+            nonlocal position
+            for line in f:
+                position += len(line)
+                yield line.decode("utf-8", "replace")
+
+        # csv pulls lines only as it needs them, so `position` is the end of the row
+        for row in csv.reader(lines()):
+            if row:
+                yield dict(zip(header, row)), position
+
+def read_jsonl(path: str, offset: int = 0):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        position = offset
+        for line in f:
+            position += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else None, position
+
+def _marc_fields(record: bytes) -> dict:
+    """First occurrence of each data field as {tag: {subfield code: value}}"""
+    try:
+        base = int(record[12:17])
+    except ValueError:
+        raise ImportFormatError("Invalid MARC leader")
+    encoding = "utf-8" if record[9:10] == b"a" else "latin-1"
+    directory = record[24:base - 1]
+    fields = {}
+    for i in range(0, len(directory) - 11, 12):
+        tag = directory[i:i + 3].decode("ascii", "replace")
+        if tag < "010" or tag in fields:
+            continue
+        length, start = int(directory[i + 3:i + 7]), int(directory[i + 7:i + 12])
+        data = record[base + start:base + start + length].rstrip(b"\x1e")
+        subfields = {}
+        for chunk in data.split(b"\x1f")[1:]:
+            if chunk:
+                subfields.setdefault(chr(chunk[0]), chunk[1:].decode(encoding, "replace").strip())
+        fields[tag] = subfields
+    return fields
+
+def _marc_record(record: bytes) -> dict:
+    fields = _marc_fields(record)
+    field = lambda tag, code: fields.get(tag, {}).get(code)
+    title = " ".join(filter(None, (field("245", "a"), field("245", "b"))))
+    isbn = field("020", "a")
+    return {
+        "isbn": isbn.split()[0] if isbn else None,
+        "title": title.rstrip(" /:;,."),
+        "author": (field("100", "a") or field("110", "a") or "").rstrip(" ,."),
+        "publisher": (field("264", "b") or field("260", "b") or "").rstrip(" ,:;"),
+        "publication_year": field("264", "c") or field("260", "c"),
+        "category": (field("650", "a") or "").rstrip(" ."),
+    }
+
+def read_marc(path: str, offset: int = 0):
+    """Stream MARC21 (ISO 2709) records one at a time using their leader length"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        position = offset
+        while True:
+            leader = f.read(5)
+            if not leader.strip():
+                return
+            try:
+                length = int(leader)
+            except ValueError:
+                raise ImportFormatError(f"Invalid MARC record length at byte {position}")
+            record = leader + f.read(length - 5)
+            position += length
+            try:
+                yield _marc_record(record), position
+            except (ImportFormatError, ValueError):
+                yield None, position
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "marc": read_marc}
+
+def normalize_isbn(value) -> str:
+    """ISBN-10/13 without separators, or None if it is not one"""
+    isbn = re.sub(r"[^0-9Xx]", "", str(value or "")).upper()
+    return isbn if _ISBN_RE.match(isbn) else None
+
+def _text(value, limit: int):
+    if isinstance(value, list):
+        value = ", ".join(map(str, value))
+    value = " ".join(str(value).split()) if value is not None else ""
+    return value[:limit] or None
+
+def clean_record(raw):
+    """Map a raw source record onto Book fields; None if it cannot be imported"""
+    if not raw:
+        return None
+    values = {}
+    for field, aliases in _FIELD_ALIASES.items():
+        values[field] = next((raw[name] for name in aliases if raw.get(name) not in (None, "")), None)
+    isbn = normalize_isbn(values["isbn"])
+    title = _text(values["title"], 200)
+    if not isbn or not title:
+        return None
+    year = _YEAR_RE.search(str(values["publication_year"] or ""))
+    try:
+        copies = max(int(values["copies"]), 0) if values["copies"] is not None else 1
+    except (TypeError, ValueError):
+        copies = 1
+    return {
+        "isbn": isbn,
+        "title": title,
+        "author": _text(values["author"], 100) or "Unknown",
+        "publisher": _text(values["publisher"], 100),
+        "publication_year": int(year.group()) if year else None,
+        "category": _text(values["category"], 50),
+        "copies": copies,
+    }
+
+def batches(records, size: int = IMPORT_BATCH_SIZE):
+    """Group (raw, offset) pairs into (clean records, end offset, rejected count)"""
+    batch, rejected, offset = [], 0, None
+    for raw, offset in records:
+        record = clean_record(raw)
+        if record:
+            batch.append(record)
+        else:
+            rejected += 1
+        if len(batch) >= size:
+            yield batch, offset, rejected
+            batch, rejected = [], 0
+    if batch or rejected:
+        yield batch, offset, rejected
+
+class CategoryCache:
+    """Category name -> id, filled lazily and creating unknown categories"""
+
+    def __init__(self):
+        self._ids = {}
+
+    def clear(self):
+        self._ids.clear()
+
+    def resolve(self, conn, names) -> dict:
+        # Keys are casefolded to match MySQL's case-insensitive unique name
+        missing = sorted({name for name in names if name.casefold() not in self._ids})
+        if missing:
+            now = utcnow()
+            upsert(conn, Category, [
+                {"name": name, "created_at": now, "updated_at": now, "is_deleted": False} for name in missing
+            ], ["name"], {"name": lambda incoming: Category.name})
+            rows = conn.execute(select(Category.name, Category.id).where(Category.name.in_(missing)))
+            self._ids.update((name.casefold(), category_id) for name, category_id in rows)
+        return {name: self._ids.get(name.casefold()) for name in names}
+
+def write_batch(db: Session, records, categories: CategoryCache, index: bool = True) -> int:
+    """Upsert one batch of clean records on ISBN in a single multi-row statement"""
+    # Last occurrence of an ISBN wins; sorted keys keep concurrent writers from deadlocking
+    records = sorted({record["isbn"]: record for record in records}.values(), key=lambda r: r["isbn"])
+    if not records:
+        return 0
+    try:
+        conn = db.connection()
+        category_ids = categories.resolve(conn, {r["category"] for r in records if r["category"]})
+        now = utcnow()
+        rows = [
+            {
+                "isbn": r["isbn"],
+                "title": r["title"],
+                "author": r["author"],
+                "publisher": r["publisher"],
+                "publication_year": r["publication_year"],
+                "category_id": category_ids.get(r["category"]) if r["category"] else None,
+                "total_copies": r["copies"],
+                "available_copies": r["copies"],
+                "created_at": now,
+                "updated_at": now,
+                "is_deleted": False,
+            }
+            for r in records
+        ]
+        upsert(conn, Book, rows, ["isbn"], {
+            column: (lambda column: lambda incoming: getattr(incoming, column))(column)
+            for column in _UPDATED_COLUMNS
+        })
+        if index:
+            book_ids = conn.execute(select(Book.id).where(Book.isbn.in_([r["isbn"] for r in records]))).scalars()
+            search.index_books(conn, list(book_ids))
+        db.commit()
+    except Exception:
+        # Categories created in the failed transaction no longer exist
+        categories.clear()
+        db.rollback()
+        raise
+    fragment_cache.invalidate("books")
+    return len(rows)
+
+def load_checkpoint(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"offset": 0, "imported": 0, "rejected": 0}
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+# Per-process state of import workers
+_worker = {}
+
+def _init_worker(url: str, index: bool):
+    engine = create_engine(url)
+    _worker.update(
+        session=sessionmaker(bind=engine, autoflush=False)(),
+        categories=CategoryCache(),
+        index=index,
+    )
+
+def _import_batch(records) -> int:
+    return retry_on_deadlock(write_batch, _worker["session"], records, _worker["categories"], _worker["index"])
+
+def import_file(path: str, fmt: str = None, workers: int = 1, batch_size: int = IMPORT_BATCH_SIZE,
+                checkpoint_path: str = None, url: str = None, index: bool = True, progress=None) -> dict:
+    """Stream a CSV, JSONL or MARC21 file into the catalog.
+
+    The file is parsed in this process and written in batches of
+    `batch_size` multi-row upserts, by `workers` processes when more than
+    one. After every batch that completed in file order the offset is
+    saved to `checkpoint_path`, so a rerun with the same checkpoint picks
+    up where the previous one stopped. `progress(totals)` is called after
+    each batch.
+    """
+    fmt = fmt or detect_format(path)
+    url = url or SQLALCHEMY_DATABASE_URL
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path else {"offset": 0, "imported": 0, "rejected": 0}
+    totals = {"imported": checkpoint["imported"], "rejected": checkpoint["rejected"], "rows_per_second": 0.0}
+    started, imported_before = time.perf_counter(), totals["imported"]
+    source = batches(READERS[fmt](path, checkpoint["offset"]), batch_size)
+
+    def done(imported, offset, rejected):
+        totals["imported"] += imported
+        totals["rejected"] += rejected
+        elapsed = time.perf_counter() - started
+        totals["rows_per_second"] = round((totals["imported"] - imported_before) / elapsed, 1) if elapsed else 0.0
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, {"offset": offset, "imported": totals["imported"], "rejected": totals["rejected"]})
+        if progress:
+            progress(dict(totals))
+
+    if workers <= 1:
+        _init_worker(url, index)
+        try:
+            for records, offset, rejected in source:
+                done(_import_batch(records), offset, rejected)
+        finally:
+            _worker["session"].close()
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(url, index)) as pool:
+            # Bounded in-flight window, drained in file order so checkpoints stay monotonic
+            pending = deque()
+            for records, offset, rejected in source:
+                pending.append((pool.apply_async(_import_batch, (records,)), offset, rejected))
+                if len(pending) >= workers * 2:
+                    result, offset, rejected = pending.popleft()
+                    done(result.get(), offset, rejected)
+            while pending:
+                result, offset, rejected = pending.popleft()
+                done(result.get(), offset, rejected)
+
+    # Bulk upserts bypass the ORM listeners that keep the dashboard counters current
+    engine = create_engine(url)
+    try:
+        with Session(engine) as db:
+            stats.reconcile(db)
+            db.commit()
+    finally:
+        engine.dispose()
+    logger.info("Imported %s: %s", path, totals)
+    return totals
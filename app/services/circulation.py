@@ -0,0 +1,413 @@
+import asyncio
+from datetime import datetime, timedelta
+import logging
+import os
+import random
+import time
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, aliased
+from ..database.connection import SessionLocal
+from ..database.models import Book, BookLoan, Reservation, ReservationStatus, utcnow
+from ..utils.fragment_cache import fragment_cache
+from . import stats
+from .availability import availability_cache, record_changes
+
+logger = logging.getLogger(__name__)
+
+LOAN_PERIOD_DAYS = int(os.getenv("LOAN_PERIOD_DAYS", "14"))
+# Days a member has to collect a copy set aside for their hold
+HOLD_PICKUP_DAYS = int(os.getenv("HOLD_PICKUP_DAYS", "3"))
+HOLD_SWEEP_BATCH_SIZE = int(os.getenv("HOLD_SWEEP_BATCH_SIZE", "500"))
+MAX_CHECKOUT_ATTEMPTS = 5
+# MySQL deadlock and lock wait timeout
+_RETRYABLE_MYSQL_ERRORS = {1213, 1205}
+
+class CirculationError(Exception):
+    """Base class for checkout/return failures shown to the user"""
+
+class BookUnavailable(CirculationError):
+    def __init__(self, book_id: int):
+        super().__init__(f"Book {book_id} has no available copies")
+        self.book_id = book_id
+
+class LoanNotFound(CirculationError):
+    def __init__(self, loan_id: int):
+        super().__init__(f"Loan {loan_id} does not exist or was already returned")
+        self.loan_id = loan_id
+
+class BookNotFound(CirculationError):
+    def __init__(self, book_id: int):
+        super().__init__(f"Book {book_id} does not exist")
+        self.book_id = book_id
+
+class BookAvailable(CirculationError):
+    def __init__(self, book_id: int):
+        super().__init__(f"Book {book_id} has copies available; borrow it instead")
+        self.book_id = book_id
+
+class AlreadyReserved(CirculationError):
+    def __init__(self, book_id: int):
+        super().__init__(f"You already have a hold on book {book_id}")
+        self.book_id = book_id
+
+class ReservationNotFound(CirculationError):
+    def __init__(self, reservation_id: int):
+        super().__init__(f"Reservation {reservation_id} does not exist or is no longer active")
+        self.reservation_id = reservation_id
+
+# Holds still in a book's queue
+ACTIVE_HOLDS = (ReservationStatus.WAITING, ReservationStatus.READY)
+
+def is_retryable(exc: OperationalError) -> bool:
+    """Whether a failed transaction can simply be run again"""
+    args = getattr(exc.orig, "args", ())
+    if args and args[0] in _RETRYABLE_MYSQL_ERRORS:
+        return True
+    return "database is locked" in str(exc.orig)
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, 0.01 * 2 ** attempt)
+
+def checkout_books(db: Session, user_id: int, book_ids, loan_days: int = None, now: datetime = None):
+    """Lend one copy of each book to `user_id` in a single transaction.
+
+    Each copy is claimed with a conditional UPDATE, so concurrent borrowers
+    can never push available_copies below zero and no row is locked longer
+    than the transaction. Books are claimed in id order so multi-book
+    checkouts cannot deadlock each other. Either every book is lent or,
+    on BookUnavailable, none is. A book held for the member is lent from
+    the copy set aside for them, and borrowing fulfils their hold on it.
+    """
+    now = now or utcnow()
+    due_date = now + timedelta(days=loan_days or LOAN_PERIOD_DAYS)
+    claimed = []
+    try:
+        # Copies set aside for the member's ready holds are theirs already
+        holds = dict(db.execute(
+            select(Reservation.book_id, Reservation.status)
+            .where(Reservation.user_id == user_id, Reservation.book_id.in_(set(book_ids)), Reservation.status.in_(ACTIVE_HOLDS))
+        ).all())
+        for book_id in sorted(set(book_ids)):
+            if holds.get(book_id) == ReservationStatus.READY:
+                collected = db.execute(
+                    update(Reservation)
+                    .where(Reservation.user_id == user_id, Reservation.book_id == book_id, Reservation.status == ReservationStatus.READY)
+                    .values(status=ReservationStatus.FULFILLED, updated_at=now)
+                )
+                if collected.rowcount == 1:
+                    continue
+            result = db.execute(
+                update(Book)
+                .where(Book.id == book_id, Book.available_copies > 0, Book.is_deleted.is_(False))
+                .values(available_copies=Book.available_copies - 1, updated_at=now)
+            )
+            if result.rowcount != 1:
+                raise BookUnavailable(book_id)
+            claimed.append(book_id)
+        waiting = [book_id for book_id, status in holds.items() if status == ReservationStatus.WAITING]
+        if waiting:
+            # Borrowed without waiting for the queue after all
+            db.execute(
+                update(Reservation)
+                .where(Reservation.user_id == user_id, Reservation.book_id.in_(waiting), Reservation.status == ReservationStatus.WAITING)
+                .values(status=ReservationStatus.FULFILLED, updated_at=now)
+            )
+        record_changes(db.connection(), claimed, now)
+        loans = [
+            BookLoan(user_id=user_id, book_id=book_id, borrowed_date=now, due_date=due_date)
+            for book_id in sorted(set(book_ids))
+        ]
+        db.add_all(loans)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    availability_cache.adjust(claimed, -1)
+    return loans
+
+def return_loan(db: Session, loan_id: int, user_id: int = None, now: datetime = None) -> int:
+    """Close an open loan and hand its copy to the book's queue or the shelf; returns the book id.
+
+    Pass `user_id` to only accept returns of that member's own loans.
+    """
+    now = now or utcnow()
+    try:
+        conditions = [BookLoan.id == loan_id, BookLoan.is_returned.is_(False)]
+        if user_id is not None:
+            conditions.append(BookLoan.user_id == user_id)
+        closed = db.execute(
+            update(BookLoan).where(*conditions).values(is_returned=True, returned_date=now, updated_at=now)
+        )
+        if closed.rowcount != 1:
+            raise LoanNotFound(loan_id)
+        book_id = db.execute(select(BookLoan.book_id).where(BookLoan.id == loan_id)).scalar_one()
+        shelved = release_copies(db, book_id, 1, now)
+        stats.bump(db, stats.BORROWED_BOOKS, -1)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    availability_cache.adjust([book_id], shelved)
+    # Core updates skip the flush that would invalidate cached fragments;
+    # listings follow availability through the cache instead
+    fragment_cache.invalidate("loans")
+    return book_id
+
+def release_copies(db: Session, book_id: int, copies: int, now: datetime) -> int:
+    """Give freed copies of a book to the front of its queue; returns how many went back on the shelf.
+
+    Runs in the caller's transaction, so a returned copy is never visible
+    on the shelf before the next holder gets it. The book row is updated
+    first and its lock serializes allocations of the book.
+    """
+    db.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(available_copies=Book.available_copies + copies, updated_at=now)
+    )
+    next_up = db.execute(
+        select(Reservation.id)
+        .where(Reservation.book_id == book_id, Reservation.status == ReservationStatus.WAITING)
+        .order_by(Reservation.priority, Reservation.id)
+        .limit(copies)
+    ).scalars().all()
+    if next_up:
+        db.execute(
+            update(Reservation)
+            .where(Reservation.id.in_(next_up))
+            .values(
+                status=ReservationStatus.READY, ready_at=now,
+                expires_at=now + timedelta(days=HOLD_PICKUP_DAYS), updated_at=now,
+            )
+        )
+        db.execute(
+            update(Book).where(Book.id == book_id).values(available_copies=Book.available_copies - len(next_up))
+        )
+    shelved = copies - len(next_up)
+    if shelved:
+        record_changes(db.connection(), [book_id], now)
+    return shelved
+
+def place_hold(db: Session, user_id: int, book_id: int, priority: int = 0, now: datetime = None) -> int:
+    """Queue `user_id` for a book with no copies left; returns the reservation id.
+
+    Lower `priority` values are served first, and equal ones in the order
+    they were placed.
+    """
+    now = now or utcnow()
+    try:
+        # Locks the book, so a return cannot shelve a copy between this check and the insert
+        available = db.execute(
+            select(Book.available_copies).where(Book.id == book_id, Book.is_deleted.is_(False)).with_for_update()
+        ).scalar()
+        if available is None:
+            raise BookNotFound(book_id)
+        if available > 0:
+            raise BookAvailable(book_id)
+        if db.execute(
+            select(Reservation.id)
+            .where(Reservation.user_id == user_id, Reservation.book_id == book_id, Reservation.status.in_(ACTIVE_HOLDS))
+        ).first():
+            raise AlreadyReserved(book_id)
+        hold = Reservation(user_id=user_id, book_id=book_id, priority=priority, created_at=now, updated_at=now)
+        db.add(hold)
+        db.flush()
+        reservation_id = hold.id
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return reservation_id
+
+def cancel_hold(db: Session, reservation_id: int, user_id: int = None, now: datetime = None) -> int:
+    """Cancel an active hold; a copy set aside for it goes to the next in line. Returns the book id.
+
+    Pass `user_id` to only accept cancellations of that member's own holds.
+    """
+    now = now or utcnow()
+    try:
+        conditions = [Reservation.id == reservation_id, Reservation.status.in_(ACTIVE_HOLDS)]
+        if user_id is not None:
+            conditions.append(Reservation.user_id == user_id)
+        hold = db.execute(select(Reservation.book_id, Reservation.status).where(*conditions)).first()
+        if hold is None:
+            raise ReservationNotFound(reservation_id)
+        cancelled = db.execute(
+            update(Reservation)
+            .where(Reservation.id == reservation_id, Reservation.status == hold.status)
+            .values(status=ReservationStatus.CANCELLED, updated_at=now)
+        )
+        if cancelled.rowcount != 1:
+            raise ReservationNotFound(reservation_id)
+        shelved = release_copies(db, hold.book_id, 1, now) if hold.status == ReservationStatus.READY else 0
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    availability_cache.adjust([hold.book_id], shelved)
+    return hold.book_id
+
+def expire_holds(db: Session, now: datetime = None, batch_size: int = None) -> dict:
+    """Expire ready holds whose pickup deadline passed and pass their copies on.
+
+    Works through the overdue holds in batches of `batch_size`, each in a
+    transaction of its own. Every book is locked before its holds, in the
+    order returns take, and its freed copies go to the next holders or
+    back on the shelf.
+    """
+    now = now or utcnow()
+    batch_size = batch_size or HOLD_SWEEP_BATCH_SIZE
+    totals = {"holds_expired": 0, "copies_reallocated": 0, "copies_shelved": 0, "batches": 0}
+    while True:
+        rows = db.execute(
+            select(Reservation.id, Reservation.book_id)
+            .where(Reservation.status == ReservationStatus.READY, Reservation.expires_at < now)
+            .order_by(Reservation.expires_at, Reservation.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        by_book = {}
+        for row in rows:
+            by_book.setdefault(row.book_id, []).append(row.id)
+        shelved = {}
+        try:
+            for book_id in sorted(by_book):
+                db.execute(select(Book.id).where(Book.id == book_id).with_for_update())
+                expired = db.execute(
+                    update(Reservation)
+                    .where(
+                        Reservation.id.in_(by_book[book_id]),
+                        Reservation.status == ReservationStatus.READY,
+                        Reservation.expires_at < now,
+                    )
+                    .values(status=ReservationStatus.EXPIRED, updated_at=now)
+                ).rowcount
+                if expired:
+                    shelved[book_id] = release_copies(db, book_id, expired, now)
+                    totals["holds_expired"] += expired
+                    totals["copies_reallocated"] += expired - shelved[book_id]
+                    totals["copies_shelved"] += shelved[book_id]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for book_id, copies in shelved.items():
+            availability_cache.adjust([book_id], copies)
+        totals["batches"] += 1
+        if len(rows) < batch_size:
+            break
+    return totals
+
+def expire_holds_job():
+    """Periodic entry point: expire uncollected holds in a session of its own"""
+    db = SessionLocal()
+    try:
+        totals = expire_holds(db)
+        if totals["holds_expired"]:
+            logger.info("Expired holds: %s", totals)
+    finally:
+        db.close()
+
+def _position():
+    """1-based place of a waiting hold in its book's queue.
+
+    Counts the holds ahead of it on the (book_id, status, priority, id)
+    index: one seek plus the entries ahead, never the table.
+    """
+    ahead = aliased(Reservation)
+    return (
+        select(func.count(ahead.id) + 1)
+        .where(
+            ahead.book_id == Reservation.book_id,
+            ahead.status == ReservationStatus.WAITING,
+            or_(
+                ahead.priority < Reservation.priority,
+                and_(ahead.priority == Reservation.priority, ahead.id < Reservation.id),
+            ),
+        )
+        .correlate(Reservation)
+        .scalar_subquery()
+    )
+
+def member_holds(db: Session, user_id: int, book_id: int = None) -> list:
+    """A member's active holds with their books and queue positions, in one query"""
+    query = (
+        select(
+            Reservation.id, Reservation.book_id, Reservation.status, Reservation.expires_at,
+            Book.title, Book.author, _position().label("position"),
+        )
+        .join(Book, Book.id == Reservation.book_id)
+        .where(Reservation.user_id == user_id, Reservation.status.in_(ACTIVE_HOLDS))
+    )
+    if book_id is not None:
+        query = query.where(Reservation.book_id == book_id)
+    # Oldest first; sorted here, as the member's few holds come off the index by status
+    return [
+        {
+            "id": row.id,
+            "book_id": row.book_id,
+            "title": row.title,
+            "author": row.author,
+            "status": row.status.value,
+            "position": row.position if row.status == ReservationStatus.WAITING else None,
+            "expires_at": row.expires_at,
+        }
+        for row in sorted(db.execute(query), key=lambda row: row.id)
+    ]
+
+def book_queue(db: Session, book_id: int, limit: int) -> dict:
+    """A book's holds ready for pickup, the first `limit` still waiting, and how many wait"""
+    def holds(status):
+        return (
+            select(Reservation.id, Reservation.user_id, Reservation.status, Reservation.priority, Reservation.expires_at)
+            .where(Reservation.book_id == book_id, Reservation.status == status)
+            .order_by(Reservation.priority, Reservation.id)
+        )
+
+    ready = db.execute(holds(ReservationStatus.READY)).all()
+    waiting = db.execute(holds(ReservationStatus.WAITING).limit(limit)).all()
+    length = db.execute(
+        select(func.count(Reservation.id))
+        .where(Reservation.book_id == book_id, Reservation.status == ReservationStatus.WAITING)
+    ).scalar()
+    positions = [None] * len(ready) + list(range(1, len(waiting) + 1))
+    return {
+        "holds": [
+            {
+                "id": row.id,
+                "member_id": row.user_id,
+                "status": row.status.value,
+                "priority": row.priority,
+                "position": position,
+                "expires_at": row.expires_at,
+            }
+            for row, position in zip(ready + waiting, positions)
+        ],
+        "waiting": length,
+    }
+
+def retry_on_deadlock(func, db: Session, *args, on_retry=None, **kwargs):
+    """Run a transactional function, retrying it on deadlocks and lock timeouts"""
+    for attempt in range(MAX_CHECKOUT_ATTEMPTS):
+        try:
+            return func(db, *args, **kwargs)
+        except OperationalError as e:
+            if not is_retryable(e) or attempt == MAX_CHECKOUT_ATTEMPTS - 1:
+                raise
+            logger.info("Retrying %s after %s", func.__name__, e.orig)
+            if on_retry:
+                on_retry()
+            time.sleep(_backoff(attempt))
+
+async def retry_on_deadlock_async(func, db, *args, **kwargs):
+    """Async variant of retry_on_deadlock for AsyncSession; backs off without blocking the loop"""
+    for attempt in range(MAX_CHECKOUT_ATTEMPTS):
+        try:
+            return await db.run_sync(func, *args, **kwargs)
+        except OperationalError as e:
+            if not is_retryable(e) or attempt == MAX_CHECKOUT_ATTEMPTS - 1:
+                raise
+            logger.info("Retrying %s after %s", func.__name__, e.orig)
+            await asyncio.sleep(_backoff(attempt))
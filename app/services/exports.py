@@ -0,0 +1,131 @@
+import csv
+from datetime import date, datetime, timedelta, timezone
+import enum
+import io
+import json
+import zlib
+from sqlalchemy import select
+from ..database.connection import read_session
+from ..database.models import Book, BookLoan, Category, Fine, User, UserRole
+
+FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = 1000
+# Rows encoded together before a chunk is handed to the response
+EXPORT_ROWS_PER_CHUNK = 200
+
+def _loans():
+    return select(
+        BookLoan.id, BookLoan.user_id, User.username, BookLoan.book_id, Book.title, Book.isbn,
+        BookLoan.borrowed_date, BookLoan.due_date, BookLoan.returned_date, BookLoan.is_returned,
+        BookLoan.fine_amount,
+    ).join(User, BookLoan.user_id == User.id).join(Book, BookLoan.book_id == Book.id)
+
+def _fines():
+    return select(
+        Fine.id, Fine.loan_id, BookLoan.user_id, User.username, BookLoan.book_id, Fine.amount,
+        Fine.is_paid, Fine.paid_date, Fine.created_at,
+    ).join(BookLoan, Fine.loan_id == BookLoan.id).join(User, BookLoan.user_id == User.id)
+
+def _members():
+    return select(
+        User.id, User.username, User.email, User.first_name, User.last_name, User.phone,
+        User.address, User.created_at,
+    ).where(User.role == UserRole.MEMBER)
+
+def _books():
+    return select(
+        Book.id, Book.isbn, Book.title, Book.author, Book.publisher, Book.publication_year,
+        Category.name.label("category"), Book.total_copies, Book.available_copies, Book.created_at,
+    ).outerjoin(Category, Book.category_id == Category.id)
+
+# Export name -> (base query, entity, date range column, status filters);
+# each status maps to a function of `now` returning the filter conditions
+EXPORTS = {
+    "loans": (_loans, BookLoan, BookLoan.borrowed_date, {
+        "open": lambda now: [BookLoan.is_returned.is_(False)],
+        "returned": lambda now: [BookLoan.is_returned.is_(True)],
+        "overdue": lambda now: [BookLoan.is_returned.is_(False), BookLoan.due_date < now],
+    }),
+    "fines": (_fines, Fine, Fine.created_at, {
+        "paid": lambda now: [Fine.is_paid.is_(True)],
+        "unpaid": lambda now: [Fine.is_paid.is_(False)],
+    }),
+    "members": (_members, User, User.created_at, {}),
+    "books": (_books, Book, Book.created_at, {
+        "available": lambda now: [Book.available_copies > 0],
+        "unavailable": lambda now: [Book.available_copies <= 0],
+    }),
+}
+
+def build_query(kind: str, start: date = None, end: date = None, status: str = None, now: datetime = None):
+    """Query of export `kind`, filtered by an inclusive date range and a status.
+
+    Raises KeyError for an unknown export and ValueError for an unknown status.
+    """
+    base, entity, date_column, statuses = EXPORTS[kind]
+    if status and status not in statuses:
+        raise ValueError(f"Unknown status '{status}' for {kind}; expected one of {sorted(statuses)}")
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    query = base().where(entity.is_deleted.is_(False))
+    if start:
+        query = query.where(date_column >= datetime.combine(start, datetime.min.time()))
+    if end:
+        query = query.where(date_column < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if status:
+        query = query.where(*statuses[status](now))
+    return query.order_by(entity.id)
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+def _encode_csv(columns, rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+def _encode_jsonl(columns, rows) -> str:
+    return "".join(json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + "\n" for row in rows)
+
+_ENCODERS = {"csv": _encode_csv, "jsonl": _encode_jsonl}
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _rows(query):
+    """Column names, then partitions of rows as they arrive from a server-side cursor"""
+    db = read_session()
+    try:
+        result = db.execute(query.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE))
+        yield list(result.keys())
+        for partition in result.partitions(EXPORT_ROWS_PER_CHUNK):
+            yield partition
+    finally:
+        db.close()
+
+def stream_export(query, fmt: str = "csv", compress: bool = False):
+    """Yield the encoded export of `query` in chunks; memory use does not grow with its size.
+
+    Opens a session of its own on a read replica, since the response
+    outlives the request's session.
+    """
+    encode = _ENCODERS[fmt]
+
+    def chunks():
+        rows = _rows(query)
+        columns = next(rows)
+        if fmt == "csv":
+            yield _encode_csv(columns, [columns]).encode()
+        for partition in rows:
+            yield encode(columns, partition).encode()
+
+    return _gzip(chunks()) if compress else chunks()
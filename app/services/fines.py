@@ -0,0 +1,194 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import logging
+import os
+from sqlalchemy import and_, bindparam, case, func, insert, or_, select, text, update
+from sqlalchemy.orm import Session
+from ..database.connection import SessionLocal
+from ..database.functions import days_between
+from ..database.models import BookLoan, Fine, JobWatermark, utcnow
+from ..database.upsert import upsert
+from ..utils.fragment_cache import fragment_cache
+
+logger = logging.getLogger(__name__)
+
+# Amounts are in cents/paise, like BookLoan.fine_amount
+FINE_DAILY_RATE = int(os.getenv("FINE_DAILY_RATE", "50"))
+FINE_MAX_AMOUNT = int(os.getenv("FINE_MAX_AMOUNT", "2000"))
+FINE_GRACE_DAYS = int(os.getenv("FINE_GRACE_DAYS", "0"))
+FINE_CHUNK_SIZE = 1000
+WATERMARK = "fines"
+# Loans updated this long before the watermark are read again, since a
+# transaction can commit after a run has passed its updated_at (and
+# worker clocks differ slightly); revisiting a loan is harmless
+COMMIT_SLACK = timedelta(minutes=1)
+# Name of the MySQL advisory lock held by a running computation; every
+# worker schedules the job and cron may run compute_fines.py as well
+FINES_LOCK = "library_compute_fines"
+
+@contextmanager
+def _fines_lock(engine):
+    """Hold the FINES_LOCK advisory lock on a connection of its own; yields whether it was acquired.
+
+    The session commits after every chunk and may change connections, so
+    the lock lives on a separate one for the whole run.
+    """
+    if engine.dialect.name != "mysql":
+        yield True
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": FINES_LOCK}).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": FINES_LOCK})
+
+def fine_amount(now: datetime):
+    """SQL expression for the fine a loan owes as of `now`.
+
+    Days overdue are counted until the return date, or until `now` for
+    open loans; days within the grace period are free and the total is
+    capped at FINE_MAX_AMOUNT.
+    """
+    overdue = days_between(BookLoan.due_date, func.coalesce(BookLoan.returned_date, now)) - FINE_GRACE_DAYS
+    return case(
+        (overdue <= 0, 0),
+        (overdue * FINE_DAILY_RATE >= FINE_MAX_AMOUNT, FINE_MAX_AMOUNT),
+        else_=overdue * FINE_DAILY_RATE,
+    )
+
+def _keyset_chunks(db: Session, conditions, sort_column):
+    """Yield ids of loans matching `conditions` in chunks, walking (sort_column, id)"""
+    last = None
+    while True:
+        query = select(BookLoan.id, sort_column).where(*conditions)
+        if last is not None:
+            query = query.where(or_(sort_column > last[1], and_(sort_column == last[1], BookLoan.id > last[0])))
+        rows = db.connection().execute(
+            query.order_by(sort_column, BookLoan.id).limit(FINE_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield [row.id for row in rows]
+        last = rows[-1]
+
+def _sync_fines(conn, loan_ids, now: datetime, totals: dict):
+    """Make each loan's unpaid Fine equal its fine minus what was already paid"""
+    rows = conn.execute(
+        select(
+            BookLoan.id,
+            BookLoan.fine_amount,
+            func.coalesce(func.sum(case((Fine.is_paid.is_(True), Fine.amount), else_=0)), 0).label("paid"),
+            func.max(case((Fine.is_paid.is_(False), Fine.id))).label("open_fine_id"),
+            func.max(case((Fine.is_paid.is_(False), Fine.amount))).label("open_amount"),
+        )
+        .outerjoin(Fine, and_(Fine.loan_id == BookLoan.id, Fine.is_deleted.is_(False)))
+        .where(BookLoan.id.in_(loan_ids))
+        .group_by(BookLoan.id, BookLoan.fine_amount)
+    )
+    created, changed, cleared = [], [], []
+    for row in rows:
+        outstanding = (row.fine_amount or 0) - row.paid
+        if outstanding > 0 and row.open_fine_id is None:
+            created.append({
+                "loan_id": row.id, "amount": outstanding, "is_paid": False,
+                "created_at": now, "updated_at": now, "is_deleted": False,
+            })
+        elif outstanding > 0 and row.open_amount != outstanding:
+            changed.append({"fine_id": row.open_fine_id, "amount": outstanding})
+        elif outstanding <= 0 and row.open_fine_id is not None:
+            cleared.append({"fine_id": row.open_fine_id})
+
+    if created:
+        conn.execute(insert(Fine), created)
+    if changed:
+        conn.execute(
+            update(Fine).where(Fine.id == bindparam("fine_id")).values(amount=bindparam("amount"), updated_at=now),
+            changed,
+        )
+    if cleared:
+        # Fine waived, e.g. the due date was extended: retire the unpaid charge
+        conn.execute(
+            update(Fine).where(Fine.id == bindparam("fine_id")).values(is_deleted=True, updated_at=now),
+            cleared,
+        )
+    totals["fines_created"] += len(created)
+    totals["fines_updated"] += len(changed)
+    totals["fines_cleared"] += len(cleared)
+
+def _process(db: Session, loan_ids, now: datetime, totals: dict):
+    conn = db.connection()
+    amount = fine_amount(now)
+    result = conn.execute(
+        update(BookLoan)
+        .where(BookLoan.id.in_(loan_ids), func.coalesce(BookLoan.fine_amount, -1) != amount)
+        # Keep updated_at: a recomputed fine is not a change the next run must revisit
+        .values(fine_amount=amount, updated_at=BookLoan.updated_at)
+    )
+    totals["loans_updated"] += result.rowcount
+    _sync_fines(conn, loan_ids, now, totals)
+    totals["loans_scanned"] += len(loan_ids)
+    db.commit()
+    if result.rowcount:
+        fragment_cache.invalidate("loans")
+
+def compute_fines(db: Session, now: datetime = None, full: bool = False):
+    """Bring BookLoan.fine_amount and unpaid Fine rows up to date.
+
+    Only two sets of loans are visited: loans updated since the last
+    successful run (returned, due date changed, ...) and open overdue
+    loans that have not reached the cap yet, whose fine grows every day.
+    Each chunk of FINE_CHUNK_SIZE loans is one UPDATE computing the fines
+    in SQL plus a few batched Fine writes, committed on its own. Running
+    it again is harmless; the watermark only moves once a run completes,
+    and each run overlaps the last by COMMIT_SLACK.
+    Pass `full=True` to ignore the watermark and revisit every loan.
+
+    Runs never overlap: while another one holds FINES_LOCK this returns
+    None without doing anything, since both would create the same Fines.
+    """
+    with _fines_lock(db.get_bind()) as acquired:
+        if not acquired:
+            logger.info("Fines are being computed elsewhere; skipping this run")
+            return None
+        return _compute_fines(db, now, full)
+
+def _compute_fines(db: Session, now: datetime = None, full: bool = False) -> dict:
+    now = now or utcnow()
+    since = None if full else db.query(JobWatermark.value).filter(JobWatermark.name == WATERMARK).scalar()
+    totals = {"loans_scanned": 0, "loans_updated": 0, "fines_created": 0, "fines_updated": 0, "fines_cleared": 0}
+    try:
+        changed = [BookLoan.is_deleted.is_(False)]
+        if since is not None:
+            changed.append(BookLoan.updated_at >= since - COMMIT_SLACK)
+        for loan_ids in _keyset_chunks(db, changed, BookLoan.updated_at):
+            _process(db, loan_ids, now, totals)
+
+        accruing = [
+            BookLoan.is_returned.is_(False),
+            BookLoan.due_date < now,
+            BookLoan.is_deleted.is_(False),
+            func.coalesce(BookLoan.fine_amount, 0) < FINE_MAX_AMOUNT,
+        ]
+        for loan_ids in _keyset_chunks(db, accruing, BookLoan.due_date):
+            _process(db, loan_ids, now, totals)
+
+        upsert(db.connection(), JobWatermark, [{"name": WATERMARK, "value": now}], ["name"], {
+            "value": lambda incoming: incoming.value
+        })
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return totals
+
+def compute_fines_job():
+    """Periodic entry point: compute fines in a session of its own"""
+    db = SessionLocal()
+    try:
+        totals = compute_fines(db)
+        if totals is not None:
+            logger.info("Computed fines: %s", totals)
+    finally:
+        db.close()
@@ -0,0 +1,181 @@
+from datetime import datetime
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session, joinedload, raiseload
+from ..database.models import Book, BookLoan, BookLoanArchive, Category, Fine, User, UserRole, utcnow
+from ..utils.pagination import keyset_paginate
+from .archive import loan_history
+from .circulation import member_holds
+
+# Member listing sorts: query value -> (column, descending)
+MEMBER_SORTS = {
+    "join_date": (User.created_at, True),
+    "username": (User.username, False),
+}
+
+def member_row(user: User, books_borrowed: int) -> dict:
+    """Template-friendly view of a member listing row"""
+    name = " ".join(part for part in (user.first_name, user.last_name) if part)
+    return {
+        "id": user.id,
+        "name": name or user.username,
+        "email": user.email,
+        "role": user.role.value.title(),
+        "status": "Inactive" if user.is_deleted else "Active",
+        "join_date": user.created_at.strftime("%Y-%m-%d"),
+        "books_borrowed": books_borrowed,
+    }
+
+def list_members(db: Session, sort: str = "join_date", cursor: str = None, limit: int = 20):
+    """One keyset page of members; returns (members, next_cursor).
+
+    Raises KeyError for an unknown sort and InvalidCursor for a bad cursor.
+    """
+    column, descending = MEMBER_SORTS[sort]
+    query = db.query(User).filter(User.role == UserRole.MEMBER)
+    members, next_cursor = keyset_paginate(
+        query, sort, column, User.id, cursor, limit, descending,
+        key=lambda user: (getattr(user, column.key), user.id)
+    )
+
+    # Open loans for the whole page in one grouped query
+    open_loans = dict(
+        db.query(BookLoan.user_id, func.count(BookLoan.id))
+        .filter(
+            BookLoan.user_id.in_([member.id for member in members]),
+            BookLoan.is_returned.is_(False),
+            BookLoan.is_deleted.is_(False)
+        )
+        .group_by(BookLoan.user_id)
+        .all()
+    ) if members else {}
+    return [member_row(member, open_loans.get(member.id, 0)) for member in members], next_cursor
+
+def _with_book_and_category():
+    # Book and category come in the same query as the loan; any other lazy
+    # load raises instead of silently issuing one query per row
+    return joinedload(BookLoan.book).joinedload(Book.category), raiseload("*")
+
+def loan_stats(db: Session, user_id: int, now: datetime = None) -> dict:
+    """Loan counts and fine totals of a member, in two aggregate queries.
+
+    Archived loans count towards the total; they are all returned and
+    have no fines, so the other figures only need book_loans.
+    """
+    now = now or utcnow()
+    open_loan = BookLoan.is_returned.is_(False)
+    archived = (
+        select(func.count(BookLoanArchive.id))
+        .where(BookLoanArchive.user_id == user_id, BookLoanArchive.is_deleted.is_(False))
+        .scalar_subquery()
+    )
+    total_loans, open_loans, overdue = (
+        db.query(
+            func.count(BookLoan.id) + archived,
+            func.coalesce(func.sum(case((open_loan, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((and_(open_loan, BookLoan.due_date < now), 1), else_=0)), 0),
+        )
+        .filter(BookLoan.user_id == user_id, BookLoan.is_deleted.is_(False))
+        .one()
+    )
+    unpaid, paid = (
+        db.query(
+            func.coalesce(func.sum(case((Fine.is_paid.is_(False), Fine.amount), else_=0)), 0),
+            func.coalesce(func.sum(case((Fine.is_paid.is_(True), Fine.amount), else_=0)), 0),
+        )
+        .join(BookLoan, Fine.loan_id == BookLoan.id)
+        .filter(BookLoan.user_id == user_id, Fine.is_deleted.is_(False))
+        .one()
+    )
+    return {
+        "total_loans": total_loans,
+        "total_borrowed": open_loans,
+        "overdue_books": overdue,
+        "fines_outstanding": unpaid,
+        "fines_paid": paid,
+    }
+
+def _loan_status(loan: BookLoan, now: datetime) -> str:
+    if loan.is_returned:
+        return "Returned"
+    return "Overdue" if loan.due_date < now else "Active"
+
+def member_dashboard(db: Session, user_id: int, now: datetime = None) -> dict:
+    """Open loans with their books and categories, active holds, and the member's totals.
+
+    Issues the same four queries however many loans and holds the member has.
+    """
+    now = now or utcnow()
+    loans = (
+        db.query(BookLoan)
+        .options(*_with_book_and_category())
+        .filter(BookLoan.user_id == user_id, BookLoan.is_returned.is_(False), BookLoan.is_deleted.is_(False))
+        .order_by(BookLoan.due_date)
+        .all()
+    )
+    borrowed_books = [
+        {
+            "id": loan.id,
+            "book_id": loan.book.id,
+            "title": loan.book.title,
+            "author": loan.book.author,
+            "category": loan.book.category.name if loan.book.category else None,
+            "borrow_date": loan.borrowed_date.strftime("%Y-%m-%d"),
+            "due_date": loan.due_date.strftime("%Y-%m-%d"),
+            "status": _loan_status(loan, now),
+            "fine": loan.fine_amount or 0,
+        }
+        for loan in loans
+    ]
+    return {
+        "borrowed_books": borrowed_books,
+        "holds": member_holds(db, user_id),
+        "stats": loan_stats(db, user_id, now),
+    }
+
+def member_detail(db: Session, member_id: int, now: datetime = None):
+    """A member with their full loan history, or None if there is no such member.
+
+    The history spans book_loans and the archive and comes with book
+    titles and categories in one query, so the page costs four queries
+    whatever its length.
+    """
+    now = now or utcnow()
+    member = (
+        db.query(User)
+        .options(raiseload("*"))
+        .filter(User.id == member_id, User.role == UserRole.MEMBER)
+        .one_or_none()
+    )
+    if member is None:
+        return None
+    history = loan_history(lambda loans: [loans.user_id == member_id, loans.is_deleted.is_(False)]).subquery()
+    loans = sorted(
+        db.query(history, Book.title, Category.name.label("category"))
+        .join(Book, Book.id == history.c.book_id)
+        .outerjoin(Category, Book.category_id == Category.id)
+        .all(),
+        key=lambda loan: (loan.borrowed_date, loan.id),
+        reverse=True,
+    )
+    stats = loan_stats(db, member_id, now)
+    return {
+        "member": {
+            **member_row(member, stats["total_borrowed"]),
+            "phone": member.phone,
+            "address": member.address,
+        },
+        "stats": stats,
+        "transactions": [
+            {
+                "id": loan.id,
+                "title": loan.title,
+                "category": loan.category,
+                "issue_date": loan.borrowed_date,
+                "due_date": loan.due_date,
+                "return_date": loan.returned_date,
+                "rent_fee": loan.fine_amount or 0,
+                "status": _loan_status(loan, now),
+            }
+            for loan in loans
+        ],
+    }
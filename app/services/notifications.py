@@ -0,0 +1,204 @@
+import asyncio
+from datetime import datetime, timedelta
+import json
+import os
+from sqlalchemy import select
+from ..database.connection import get_async_engine
+from ..database.models import Book, BookLoan, Reservation, ReservationStatus, utcnow
+
+# Open event streams per worker; more are turned away with 503
+SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", "10000"))
+# Seconds between comments sent on idle streams, so proxies keep them open
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+# Seconds between the worker's polls for new events
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "5"))
+# Events buffered per stream; a client that falls this far behind is disconnected
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "16"))
+# Milliseconds browsers wait before reconnecting a dropped stream
+SSE_RETRY_MS = 5000
+# How long before its due date a loan is announced as due soon
+DUE_SOON = timedelta(days=1)
+# Holds are re-read this long after they became ready, since a transaction
+# can commit after a later one
+COMMIT_SLACK = timedelta(seconds=5)
+
+def format_event(kind: str, data: dict) -> str:
+    """One SSE message; formatted once and shared by every stream it goes to"""
+    return f"event: {kind}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+class Subscriber:
+    __slots__ = ("user_id", "queue")
+
+    def __init__(self, user_id: int, queue_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(queue_size)
+
+class NotificationHub:
+    """Fans events out to this worker's open event streams, by member.
+
+    Every stream has a small bounded queue. Publishing never waits: a
+    stream whose queue is full belongs to a client that stopped reading,
+    and is closed rather than buffered for; the browser reconnects and
+    reloads the page state it missed.
+    """
+
+    def __init__(self, max_connections: int, queue_size: int):
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self.connections = 0
+        self.events = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def full(self) -> bool:
+        return self.connections >= self.max_connections
+
+    def members(self):
+        """Ids of the members with at least one open stream"""
+        return self._subscribers.keys()
+
+    def subscribe(self, user_id: int) -> Subscriber:
+        subscriber = Subscriber(user_id, self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(subscriber)
+        self.connections += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        streams = self._subscribers.get(subscriber.user_id)
+        if streams is None or subscriber not in streams:
+            return
+        streams.discard(subscriber)
+        if not streams:
+            del self._subscribers[subscriber.user_id]
+        self.connections -= 1
+
+    def publish(self, user_id: int, event: str) -> int:
+        """Queue `event` on every stream of `user_id`; returns how many streams got it"""
+        delivered = 0
+        for subscriber in list(self._subscribers.get(user_id, ())):
+            try:
+                subscriber.queue.put_nowait(event)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+        self.events += delivered
+        return delivered
+
+    def _drop(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber)
+        self.dropped += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)  # ends the stream
+
+    async def stream(self, user_id: int):
+        """SSE body for one member: their events as they come, and heartbeats in between"""
+        if self.full():
+            # Lost a race with another connection since the endpoint checked
+            self.rejected += 1
+            return
+        subscriber = self.subscribe(user_id)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    event = ": heartbeat\n\n"
+                if event is None:
+                    break
+                yield event
+        finally:
+            self.unsubscribe(subscriber)
+
+    def render(self) -> str:
+        """Stream gauges and counters in the Prometheus text format"""
+        return "".join(
+            f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n{name} {value}\n"
+            for name, kind, help_text, value in (
+                ("sse_connections", "gauge", "Open event streams.", self.connections),
+                ("sse_events_total", "counter", "Events queued on event streams.", self.events),
+                ("sse_dropped_total", "counter", "Streams closed because the client fell behind.", self.dropped),
+                ("sse_rejected_total", "counter", "Streams refused at the connection cap.", self.rejected),
+            )
+        )
+
+hub = NotificationHub(SSE_MAX_CONNECTIONS, SSE_QUEUE_SIZE)
+
+def holds_ready_between(start: datetime, end: datetime):
+    """Holds that became ready in [start, end], with their book titles"""
+    return (
+        select(Reservation.id, Reservation.user_id, Reservation.book_id, Reservation.expires_at, Book.title)
+        .join(Book, Book.id == Reservation.book_id)
+        .where(Reservation.status == ReservationStatus.READY, Reservation.ready_at >= start, Reservation.ready_at <= end)
+    )
+
+def loans_due_between(start: datetime, end: datetime):
+    """Open loans due in (start, end], with their book titles"""
+    return (
+        select(BookLoan.id, BookLoan.user_id, BookLoan.book_id, BookLoan.due_date, Book.title)
+        .join(Book, Book.id == BookLoan.book_id)
+        .where(
+            BookLoan.is_returned.is_(False),
+            BookLoan.due_date > start,
+            BookLoan.due_date <= end,
+            BookLoan.is_deleted.is_(False),
+        )
+    )
+
+class EventSource:
+    """Finds what members should hear about, in a few queries per poll however many are listening.
+
+    Holds that became ready and loans that just became due soon or overdue
+    since the last poll are published to the members with open streams.
+    """
+
+    def __init__(self, hub: NotificationHub):
+        self.hub = hub
+        self._polled_at = None
+        self._seen = set()
+
+    def skip(self, now: datetime = None):
+        """Move past a poll nobody was listening to; pages load current state when streams open"""
+        self._polled_at = now or utcnow()
+        self._seen = set()
+
+    async def poll(self, conn, now: datetime = None) -> int:
+        """Publish the events since the last poll; returns how many streams got one"""
+        now = now or utcnow()
+        since = self._polled_at
+        if since is None or not self.hub.members():
+            self.skip(now)
+            return 0
+        listening = set(self.hub.members())
+        delivered = 0
+
+        rows = (await conn.execute(holds_ready_between(since - COMMIT_SLACK, now))).all()
+        for row in rows:
+            if row.id not in self._seen and row.user_id in listening:
+                delivered += self.hub.publish(row.user_id, format_event("hold_ready", {
+                    "reservation_id": row.id, "book_id": row.book_id, "title": row.title, "expires_at": row.expires_at,
+                }))
+        # Only holds still inside the re-read window need remembering
+        self._seen = {row.id for row in rows}
+
+        for kind, start, end in (("loan_overdue", since, now), ("loan_due_soon", since + DUE_SOON, now + DUE_SOON)):
+            rows = (await conn.execute(loans_due_between(start, end))).all()
+            for row in rows:
+                if row.user_id in listening:
+                    delivered += self.hub.publish(row.user_id, format_event(kind, {
+                        "loan_id": row.id, "book_id": row.book_id, "title": row.title, "due_date": row.due_date,
+                    }))
+        self._polled_at = now
+        return delivered
+
+event_source = EventSource(hub)
+
+async def poll_job():
+    """Periodic entry point: one poll of the event source for this worker's streams"""
+    if not hub.members():
+        event_source.skip()
+        return
+    async with get_async_engine().connect() as conn:
+        await event_source.poll(conn)
@@ -0,0 +1,237 @@
+from datetime import datetime, timezone
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from sqlalchemy import select, union_all
+from ..database.models import Book, BookLoan, BookLoanArchive
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional: only building the artifact needs them
+    np = sparse = None
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATIONS_PATH = os.getenv("RECOMMENDATIONS_PATH", "recommendations.bin")
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", "20"))
+# Seconds between checks for a rebuilt artifact
+RECOMMENDATIONS_RELOAD_INTERVAL = float(os.getenv("RECOMMENDATIONS_RELOAD_INTERVAL", "60"))
+
+MAGIC = b"LIBRECS1"
+# Book pairs need at least this many readers in common to count as similar
+MIN_COMMON_READERS = 2
+# Members who borrowed more books than this are left out: they add
+# quadratically many pairs and say little about any one book
+MAX_BOOKS_PER_READER = 1000
+BLOCK_SIZE = 2048
+
+class RecommendationsUnavailable(RuntimeError):
+    """Raised when numpy/scipy, needed to build recommendations, are missing"""
+
+def _read_pairs(conn, chunk_size: int = 100_000):
+    """(user id, book id) of every loan, current and archived, as two arrays"""
+    query = union_all(*(
+        select(table.user_id, table.book_id).where(table.is_deleted.is_(False))
+        for table in (BookLoan, BookLoanArchive)
+    ))
+    users, books = [], []
+    result = conn.execution_options(stream_results=True).execute(query)
+    for rows in result.partitions(chunk_size):
+        pairs = np.array(rows, dtype=np.int32)
+        users.append(pairs[:, 0])
+        books.append(pairs[:, 1])
+    if not users:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    return np.concatenate(users), np.concatenate(books)
+
+def similar_books(users, books, n_books: int, top_k: int, min_common: int = MIN_COMMON_READERS,
+                  max_per_reader: int = MAX_BOOKS_PER_READER):
+    """Top-k cosine neighbours of every book in the reader x book matrix, as CSR arrays.
+
+    Returns (indptr, neighbours, scores): the neighbours of book b are
+    neighbours[indptr[b]:indptr[b + 1]], best first. Co-borrow counts are
+    computed a block of books at a time, so memory stays bounded by the
+    block's pairs rather than by books squared.
+    """
+    n_users = int(users.max()) + 1 if len(users) else 0
+    readers = sparse.csr_matrix(
+        (np.ones(len(users), dtype=np.float32), (users, books)), shape=(n_users, n_books)
+    )
+    readers.sum_duplicates()
+    readers.data[:] = 1  # borrowed at all, however often
+    if max_per_reader:
+        per_reader = np.diff(readers.indptr)
+        readers = sparse.diags((per_reader <= max_per_reader).astype(np.float32)) @ readers
+        readers.eliminate_zeros()
+    by_book = readers.T.tocsr()
+    norms = np.sqrt(np.diff(by_book.indptr).astype(np.float32))
+
+    indptr = np.zeros(n_books + 1, dtype=np.int64)
+    neighbours, scores = [], []
+    for start in range(0, n_books, BLOCK_SIZE):
+        common = (by_book[start:start + BLOCK_SIZE] @ readers).tocsr()
+        for i in range(common.shape[0]):
+            book = start + i
+            row = slice(common.indptr[i], common.indptr[i + 1])
+            cols, counts = common.indices[row], common.data[row]
+            keep = (counts >= min_common) & (cols != book)
+            cols, counts = cols[keep], counts[keep]
+            if len(cols) > top_k:
+                best = np.argpartition(-counts / norms[cols], top_k - 1)[:top_k]
+                cols, counts = cols[best], counts[best]
+            sims = counts / (norms[book] * norms[cols])
+            order = np.lexsort((cols, -sims))
+            neighbours.append(cols[order].astype(np.int32))
+            scores.append(sims[order].astype(np.float32))
+            indptr[book + 1] = indptr[book] + len(cols)
+    empty = np.zeros(0, dtype=np.int32)
+    return (
+        indptr,
+        np.concatenate(neighbours) if neighbours else empty,
+        np.concatenate(scores) if scores else empty.astype(np.float32),
+    )
+
+def _labels(conn, book_ids, n_books: int):
+    """Title and author of `book_ids`, as offsets into one UTF-8 blob indexed by book id"""
+    offsets = np.zeros(n_books + 1, dtype=np.int64)
+    labels = {}
+    ids = sorted(set(int(book_id) for book_id in book_ids))
+    for start in range(0, len(ids), 10_000):
+        chunk = ids[start:start + 10_000]
+        for book_id, title, author in conn.execute(
+            select(Book.id, Book.title, Book.author).where(Book.id.in_(chunk), Book.is_deleted.is_(False))
+        ):
+            labels[book_id] = f"{title}\t{author or ''}".encode()
+    blob = bytearray()
+    for book_id in range(n_books):
+        blob += labels.get(book_id, b"")
+        offsets[book_id + 1] = len(blob)
+    return offsets, bytes(blob)
+
+def write_artifact(path: str, sections: dict, header: dict):
+    """Write sections (name -> bytes) behind a JSON header, then move the file into place"""
+    layout, position = {}, 0
+    for name, data in sections.items():
+        layout[name] = [position, len(data)]
+        position += len(data) + (-len(data) % 8)
+    header = json.dumps({**header, "sections": layout}).encode()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        f.write(b"\0" * (-f.tell() % 8))
+        base = f.tell()
+        for name, data in sections.items():
+            f.seek(base + layout[name][0])
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Workers holding the old file keep their mapping until they reload
+    os.replace(tmp, path)
+
+def build(conn, path: str = RECOMMENDATIONS_PATH, top_k: int = RECOMMENDATIONS_TOP_K) -> dict:
+    """Compute "readers also borrowed" for every book and write the artifact workers serve from"""
+    if np is None:
+        raise RecommendationsUnavailable("Building recommendations needs numpy and scipy: pip install -r requirements-recommendations.txt")
+    users, books = _read_pairs(conn)
+    last_book = conn.execute(select(Book.id).order_by(Book.id.desc()).limit(1)).scalar() or 0
+    n_books = max(int(books.max()) if len(books) else 0, last_book) + 1
+    indptr, neighbours, scores = similar_books(users, books, n_books, top_k)
+    label_offsets, labels = _labels(conn, neighbours, n_books)
+    built_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    write_artifact(path, {
+        "indptr": indptr.tobytes(),
+        "neighbours": neighbours.tobytes(),
+        "scores": scores.tobytes(),
+        "label_offsets": label_offsets.tobytes(),
+        "labels": labels,
+    }, {"books": n_books, "top_k": top_k, "built_at": built_at})
+    return {
+        "loans": len(users),
+        "books": n_books,
+        "books_with_neighbours": int(np.count_nonzero(np.diff(indptr))),
+        "pairs": len(neighbours),
+        "bytes": os.path.getsize(path),
+    }
+
+class _Artifact:
+    """One memory-mapped artifact; lookups read the mapping directly"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat = os.fstat(f.fileno())
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a recommendations file")
+        (header_len,) = struct.unpack_from("<I", self.mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self.mm[start:start + header_len])
+        base = start + header_len + (-(start + header_len) % 8)
+        view = memoryview(self.mm)
+
+        def section(name, fmt):
+            offset, length = self.header["sections"][name]
+            data = view[base + offset:base + offset + length]
+            return data.cast(fmt) if fmt else data
+
+        self.indptr = section("indptr", "q")
+        self.neighbours = section("neighbours", "i")
+        self.scores = section("scores", "f")
+        self.label_offsets = section("label_offsets", "q")
+        self.labels = section("labels", None)
+
+    def similar(self, book_id: int, limit: int) -> list:
+        if not 0 <= book_id < self.header["books"]:
+            return []
+        start, end = self.indptr[book_id], min(self.indptr[book_id + 1], self.indptr[book_id] + limit)
+        books = []
+        for i in range(start, end):
+            neighbour = self.neighbours[i]
+            label = bytes(self.labels[self.label_offsets[neighbour]:self.label_offsets[neighbour + 1]])
+            if not label:
+                continue  # deleted since the build
+            title, _, author = label.decode().partition("\t")
+            books.append({"id": neighbour, "title": title, "author": author, "score": round(self.scores[i], 3)})
+        return books
+
+class SimilarBooks:
+    """The current artifact of this worker, swapped for a rebuilt one by reload()"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._artifact = None
+        self._lock = threading.Lock()
+
+    def reload(self) -> bool:
+        """Map the artifact if it is new or was rebuilt; returns whether it changed"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        current = self._artifact
+        if current is not None and (stat.st_ino, stat.st_mtime_ns) == (current.stat.st_ino, current.stat.st_mtime_ns):
+            return False
+        with self._lock:
+            try:
+                artifact = _Artifact(self.path)
+            except (OSError, ValueError):
+                logger.exception("Could not load recommendations from %s", self.path)
+                return False
+            # Requests holding the old artifact finish with it; it is unmapped once unreferenced
+            self._artifact = artifact
+        logger.info("Loaded recommendations built at %s", artifact.header.get("built_at"))
+        return True
+
+    def similar(self, book_id: int, limit: int = 5) -> list:
+        """Books most often borrowed by readers of `book_id`, best first; [] without an artifact"""
+        artifact = self._artifact
+        return artifact.similar(book_id, limit) if artifact is not None else []
+
+similar_books_index = SimilarBooks(RECOMMENDATIONS_PATH)
+
+def reload_job():
+    """Periodic entry point: pick up a rebuilt artifact"""
+    similar_books_index.reload()
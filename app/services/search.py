@@ -0,0 +1,213 @@
+from collections import Counter
+import re
+import unicodedata
+from sqlalchemy import and_, delete, event, inspect, insert, select
+from sqlalchemy.orm import Session, aliased
+from ..database.models import Book, BookSearchTerm, Category, SearchVocabulary
+from ..database.upsert import upsert
+from .catalog import book_card
+
+# Relevance of a term depending on the field it appears in
+FIELD_WEIGHTS = {
+    "title": 10,
+    "isbn": 10,
+    "author": 6,
+    "category": 3,
+    "publisher": 2,
+}
+STOPWORDS = frozenset({
+    "a", "an", "and", "at", "by", "for", "from", "in", "into", "of", "on", "or", "the", "to", "with",
+})
+MAX_TERM_LENGTH = 64
+# Vocabulary entries read per autocomplete prefix before ranking by frequency
+PREFIX_SCAN_LIMIT = 200
+# Postings of the rarest term considered when intersecting several terms
+MAX_CANDIDATES = 2000
+INDEX_CHUNK_SIZE = 1000
+
+# Book columns whose change requires the book to be reindexed
+_INDEXED_ATTRS = ("title", "author", "publisher", "isbn", "category_id", "category", "is_deleted")
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text) -> list:
+    """Split text into lowercase, accent-free index terms"""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN_RE.findall(text)
+        if token not in STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+def _book_terms(doc) -> dict:
+    """Map each term of a book document to its accumulated field weight"""
+    weights = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in set(tokenize(doc[field])):
+            weights[term] += weight
+    # Also index the ISBN without separators so "978-..." and "978..." both match
+    isbn = "".join(ch for ch in doc["isbn"] or "" if ch.isalnum()).casefold()
+    if isbn and isbn not in weights:
+        weights[isbn] = FIELD_WEIGHTS["isbn"]
+    return weights
+
+def index_books(conn, book_ids):
+    """Rebuild the postings of `book_ids` from the current book rows.
+
+    Deleted or soft-deleted books end up with no postings. Safe to call
+    from bulk write paths that bypass the ORM.
+    """
+    book_ids = sorted(set(book_ids))
+    for start in range(0, len(book_ids), INDEX_CHUNK_SIZE):
+        chunk = book_ids[start:start + INDEX_CHUNK_SIZE]
+        doc_counts = _drop_postings(conn, chunk)
+
+        docs = conn.execute(
+            select(Book.id, Book.title, Book.author, Book.publisher, Book.isbn, Category.name.label("category"))
+            .outerjoin(Category, Book.category_id == Category.id)
+            .where(Book.id.in_(chunk), Book.is_deleted.is_(False))
+        )
+        postings = []
+        for doc in docs:
+            for term, weight in _book_terms(doc._mapping).items():
+                postings.append({"term": term, "book_id": doc.id, "weight": weight})
+                doc_counts[term] += 1
+        if postings:
+            conn.execute(insert(BookSearchTerm), postings)
+        _update_vocabulary(conn, doc_counts)
+
+def unindex_books(conn, book_ids):
+    """Remove the postings of `book_ids`, e.g. before the books themselves are deleted"""
+    book_ids = sorted(set(book_ids))
+    for start in range(0, len(book_ids), INDEX_CHUNK_SIZE):
+        _update_vocabulary(conn, _drop_postings(conn, book_ids[start:start + INDEX_CHUNK_SIZE]))
+
+def _drop_postings(conn, book_ids) -> Counter:
+    """Delete the postings of `book_ids`; returns the document count change of each term"""
+    doc_counts = Counter()
+    for term, in conn.execute(select(BookSearchTerm.term).where(BookSearchTerm.book_id.in_(book_ids))):
+        doc_counts[term] -= 1
+    conn.execute(delete(BookSearchTerm).where(BookSearchTerm.book_id.in_(book_ids)))
+    return doc_counts
+
+def _update_vocabulary(conn, doc_counts: Counter):
+    rows = [{"term": term, "doc_count": n} for term, n in sorted(doc_counts.items()) if n]
+    upsert(conn, SearchVocabulary, rows, ["term"], {
+        "doc_count": lambda incoming: SearchVocabulary.doc_count + incoming.doc_count
+    })
+
+def _changed(obj, attrs) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+@event.listens_for(Session, "after_flush")
+def _sync_index(session, flush_context):
+    book_ids = set()
+    for obj in session.new:
+        if isinstance(obj, Book):
+            book_ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, Book) and _changed(obj, _INDEXED_ATTRS):
+            book_ids.add(obj.id)
+        elif isinstance(obj, Category) and _changed(obj, ("name",)):
+            book_ids.update(
+                session.connection().execute(select(Book.id).where(Book.category_id == obj.id)).scalars()
+            )
+    if book_ids:
+        index_books(session.connection(), book_ids)
+
+@event.listens_for(Session, "before_flush")
+def _unindex_deleted(session, flush_context, instances):
+    # Before the flush, while the postings' foreign keys still point at the books
+    book_ids = [obj.id for obj in session.deleted if isinstance(obj, Book)]
+    if book_ids:
+        unindex_books(session.connection(), book_ids)
+
+def _fetch_books(db: Session, book_ids):
+    """Load listing rows for `book_ids`, preserving their order"""
+    if not book_ids:
+        return []
+    rows = (
+        db.query(Book, Category.name)
+        .outerjoin(Category, Book.category_id == Category.id)
+        .filter(Book.id.in_(book_ids))
+        .all()
+    )
+    by_id = {book.id: book_card(book, category) for book, category in rows}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+def search_books(db: Session, query: str, page: int = 1, per_page: int = 20):
+    """Ranked, paginated search; returns (books, has_next).
+
+    Every query term must match. Postings are read in impact order
+    (highest weight first) from the rarest term, and at most
+    MAX_CANDIDATES of them are considered, so the cost of a query does
+    not grow with the size of the catalog.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return [], False
+    doc_counts = dict(
+        db.query(SearchVocabulary.term, SearchVocabulary.doc_count)
+        .filter(SearchVocabulary.term.in_(terms))
+        .all()
+    )
+    if any(doc_counts.get(term, 0) <= 0 for term in terms):
+        return [], False
+
+    terms.sort(key=doc_counts.get)
+    page = max(page, 1)
+    if len(terms) == 1:
+        # Walk the (term, weight, book_id) index directly
+        ranked = (
+            db.query(BookSearchTerm.book_id)
+            .filter(BookSearchTerm.term == terms[0])
+            .order_by(BookSearchTerm.weight.desc(), BookSearchTerm.book_id.desc())
+        )
+    else:
+        candidates = (
+            select(BookSearchTerm.book_id, BookSearchTerm.weight)
+            .where(BookSearchTerm.term == terms[0])
+            .order_by(BookSearchTerm.weight.desc(), BookSearchTerm.book_id.desc())
+            .limit(MAX_CANDIDATES)
+            .subquery()
+        )
+        score = candidates.c.weight
+        ranked = db.query(candidates.c.book_id)
+        for term in terms[1:]:
+            posting = aliased(BookSearchTerm)
+            ranked = ranked.join(posting, and_(posting.term == term, posting.book_id == candidates.c.book_id))
+            score = score + posting.weight
+        ranked = ranked.order_by(score.desc(), candidates.c.book_id.desc())
+    book_ids = [row.book_id for row in ranked.offset((page - 1) * per_page).limit(per_page + 1)]
+    return _fetch_books(db, book_ids[:per_page]), len(book_ids) > per_page
+
+def _escape_like(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def autocomplete(db: Session, query: str, limit: int = 8, book_limit: int = 5) -> dict:
+    """Complete the last word of `query` and suggest matching books"""
+    tokens = tokenize(query)
+    if not tokens:
+        return {"suggestions": [], "books": []}
+    head, prefix = tokens[:-1], tokens[-1]
+    candidates = (
+        db.query(SearchVocabulary.term, SearchVocabulary.doc_count)
+        .filter(
+            # A constant-prefix LIKE reads a range of the term index under any
+            # collation (MySQL); the lower bound gives SQLite, which cannot
+            # use an index for LIKE here, a place to start
+            SearchVocabulary.term >= prefix,
+            SearchVocabulary.term.like(_escape_like(prefix) + "%", escape="\\"),
+            SearchVocabulary.doc_count > 0,
+        )
+        .order_by(SearchVocabulary.term)
+        .limit(PREFIX_SCAN_LIMIT)
+        .all()
+    )
+    completions = sorted(candidates, key=lambda row: (-row.doc_count, row.term))[:limit]
+    suggestions = [" ".join(head + [row.term]) for row in completions]
+    books = search_books(db, suggestions[0], per_page=book_limit)[0] if suggestions else []
+    return {"suggestions": suggestions, "books": books}
@@ -0,0 +1,199 @@
+from datetime import datetime, timezone
+import logging
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from ..database.connection import SessionLocal
+from ..database.models import Book, BookLoan, Fine, LibraryStat, User, UserRole
+from ..database.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+# Counter names stored in library_stats
+BORROWED_BOOKS = "borrowed_books"
+TOTAL_BOOKS = "total_books"
+TOTAL_MEMBERS = "total_members"
+FINES_PAID_PREFIX = "fines_paid:"
+
+def earnings_key(when: datetime) -> str:
+    """Name of the counter holding fines paid in the month of `when`"""
+    return f"{FINES_PAID_PREFIX}{when:%Y-%m}"
+
+def _upsert(db: Session, values: dict, increment: bool):
+    """Insert or update counters in a single statement"""
+    rows = [{"name": name, "value": value} for name, value in sorted(values.items())]
+    if increment:
+        new_value = lambda incoming: LibraryStat.value + incoming.value
+    else:
+        new_value = lambda incoming: incoming.value
+    upsert(db.connection(), LibraryStat, rows, ["name"], {"value": new_value})
+
+def bump(db: Session, name: str, delta: int):
+    """Atomically add `delta` to a counter.
+
+    ORM writes are tracked automatically; call this from code paths that
+    change tracked rows with bulk UPDATE/INSERT statements.
+    """
+    if delta:
+        _upsert(db, {name: delta}, increment=True)
+
+# Counters each tracked row contributes to, given its column values
+def _book_counters(v):
+    return {} if v["is_deleted"] else {TOTAL_BOOKS: 1}
+
+def _member_counters(v):
+    if v["is_deleted"] or v["role"] != UserRole.MEMBER:
+        return {}
+    return {TOTAL_MEMBERS: 1}
+
+def _loan_counters(v):
+    if v["is_deleted"] or v["is_returned"]:
+        return {}
+    return {BORROWED_BOOKS: 1}
+
+def _fine_counters(v):
+    if v["is_deleted"] or not v["is_paid"] or v["paid_date"] is None:
+        return {}
+    return {earnings_key(v["paid_date"]): v["amount"] or 0}
+
+_TRACKED = {
+    Book: (("is_deleted",), _book_counters),
+    User: (("is_deleted", "role"), _member_counters),
+    BookLoan: (("is_deleted", "is_returned"), _loan_counters),
+    Fine: (("is_deleted", "is_paid", "paid_date", "amount"), _fine_counters),
+}
+
+def _load_previous_value(target, value, oldvalue, initiator):
+    return value
+
+# Make the ORM load the previous value of tracked columns when they are
+# assigned on an expired instance, so the flush sees an accurate history
+for _model, (_attrs, _) in _TRACKED.items():
+    for _attr in _attrs:
+        event.listen(getattr(_model, _attr), "set", _load_previous_value, active_history=True, retval=True)
+
+def _snapshot(obj, attrs):
+    """Column values of `obj` before and after the pending flush"""
+    state = inspect(obj)
+    before, after = {}, {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        after[attr] = getattr(obj, attr)
+        before[attr] = history.deleted[0] if history.deleted else after[attr]
+    return before, after
+
+@event.listens_for(Session, "after_flush")
+def _track_counters(session, flush_context):
+    deltas = {}
+
+    def apply(counters, sign):
+        for name, value in counters.items():
+            deltas[name] = deltas.get(name, 0) + sign * value
+
+    for obj in session.new:
+        if type(obj) in _TRACKED:
+            attrs, counters = _TRACKED[type(obj)]
+            apply(counters(_snapshot(obj, attrs)[1]), 1)
+    for obj in session.dirty:
+        if type(obj) in _TRACKED:
+            attrs, counters = _TRACKED[type(obj)]
+            before, after = _snapshot(obj, attrs)
+            if before != after:
+                apply(counters(before), -1)
+                apply(counters(after), 1)
+    for obj in session.deleted:
+        if type(obj) in _TRACKED:
+            attrs, counters = _TRACKED[type(obj)]
+            apply(counters(_snapshot(obj, attrs)[0]), -1)
+
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        _upsert(session, deltas, increment=True)
+
+def get_counters(db: Session, now: datetime = None) -> dict:
+    """Read the dashboard counters with a single primary-key lookup"""
+    now = now or datetime.now(timezone.utc)
+    names = [BORROWED_BOOKS, TOTAL_BOOKS, TOTAL_MEMBERS, earnings_key(now)]
+    rows = db.query(LibraryStat.name, LibraryStat.value).filter(LibraryStat.name.in_(names)).all()
+    values = {name: 0 for name in names}
+    values.update({name: value for name, value in rows})
+    return {
+        "borrowed_books": values[BORROWED_BOOKS],
+        "total_books": values[TOTAL_BOOKS],
+        "total_members": values[TOTAL_MEMBERS],
+        "total_rent_current_month": values[earnings_key(now)],
+    }
+
+def recent_transactions(db: Session, limit: int = 5, now: datetime = None):
+    """Latest loans with their book title, newest first"""
+    now = now or datetime.now(timezone.utc)
+    rows = (
+        db.query(BookLoan.id, BookLoan.borrowed_date, BookLoan.fine_amount, Book.title)
+        .join(Book, BookLoan.book_id == Book.id)
+        .order_by(BookLoan.borrowed_date.desc())
+        .limit(limit)
+        .all()
+    )
+    naive_now = now.replace(tzinfo=None)
+    return [
+        (
+            {
+                "id": row.id,
+                "issue_date": max(int((naive_now - row.borrowed_date).total_seconds() // 60), 0),
+                "rent_fee": row.fine_amount or 0,
+            },
+            {"title": row.title},
+        )
+        for row in rows
+    ]
+
+def _month_bounds(now: datetime):
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+def reconcile(db: Session, now: datetime = None) -> dict:
+    """Recompute every counter from the source tables and overwrite drift.
+
+    The counter rows are locked before anything is counted, so increments
+    made meanwhile wait and land on top of the recount instead of being
+    overwritten by it. Call it at the start of a transaction: the counts
+    must be read after the lock is granted.
+    """
+    now = now or datetime.now(timezone.utc)
+    month_start, month_end = _month_bounds(now)
+    names = sorted([TOTAL_BOOKS, TOTAL_MEMBERS, BORROWED_BOOKS, earnings_key(now)])
+    # Same order as _upsert takes them in, so the two cannot deadlock
+    db.query(LibraryStat.name).filter(LibraryStat.name.in_(names)).order_by(LibraryStat.name).with_for_update().all()
+    actual = {
+        TOTAL_BOOKS: db.query(func.count(Book.id)).filter(Book.is_deleted.is_(False)).scalar(),
+        TOTAL_MEMBERS: db.query(func.count(User.id)).filter(
+            User.role == UserRole.MEMBER, User.is_deleted.is_(False)
+        ).scalar(),
+        BORROWED_BOOKS: db.query(func.count(BookLoan.id)).filter(
+            BookLoan.is_returned.is_(False), BookLoan.is_deleted.is_(False)
+        ).scalar(),
+        earnings_key(now): db.query(func.coalesce(func.sum(Fine.amount), 0)).filter(
+            Fine.is_paid.is_(True),
+            Fine.is_deleted.is_(False),
+            Fine.paid_date >= month_start,
+            Fine.paid_date < month_end,
+        ).scalar(),
+    }
+    _upsert(db, actual, increment=False)
+    return actual
+
+def reconcile_job():
+    """Periodic entry point: reconcile counters in a session of its own"""
+    db = SessionLocal()
+    try:
+        actual = reconcile(db)
+        db.commit()
+        logger.info("Reconciled library stats: %s", actual)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
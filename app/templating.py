@@ -0,0 +1,91 @@
+import logging
+import os
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateSyntaxError, nodes
+from jinja2.ext import Extension
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .database.models import Book, BookLoan, Category, Fine
+from .utils.assets import asset_url
+from .utils.fragment_cache import fragment_cache
+from .utils.metrics import InstrumentedTemplates
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = "templates"
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", ".jinja_cache")
+# Check template files for changes on every render; turn off in production
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "true").lower() in ("1", "true", "yes")
+
+class FragmentCacheExtension(Extension):
+    """{% cache key[, ttl] %}...{% endcache %}
+
+    Caches the rendered block under `key` (a string, or a list joined
+    with ':') for `ttl` seconds (FRAGMENT_CACHE_TTL by default). The first
+    part of the key is its namespace, see fragment_cache.invalidate().
+    """
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        args.append(parser.parse_expression() if parser.stream.skip_if("comma") else nodes.Const(None))
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        return fragment_cache.get_or_render(key, ttl, caller)
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    extensions=[FragmentCacheExtension],
+)
+env.globals["asset_url"] = asset_url
+
+# The one template renderer shared by every router
+templates = InstrumentedTemplates(env=env)
+
+def precompile_templates() -> int:
+    """Compile every template into memory (and the bytecode cache) ahead of the first request"""
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    compiled = 0
+    for name in env.list_templates(extensions=["html"]):
+        try:
+            env.get_template(name)
+            compiled += 1
+        except TemplateSyntaxError:
+            logger.exception("Template %s does not compile", name)
+    return compiled
+
+# Fragment cache namespaces that depend on each model; loans change book
+# availability, which cached listings read from the availability cache
+_FRAGMENT_NAMESPACES = {
+    Book: ("books",),
+    Category: ("books",),
+    BookLoan: ("loans",),
+    Fine: ("loans",),
+}
+
+# Session.info key: namespaces flushed changes touch, invalidated on commit
+_STALE_NAMESPACES = "stale_fragment_namespaces"
+
+@event.listens_for(Session, "after_flush")
+def _collect_fragments(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        namespaces = _FRAGMENT_NAMESPACES.get(type(obj))
+        if namespaces:
+            session.info.setdefault(_STALE_NAMESPACES, set()).update(namespaces)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_fragments(session):
+    # Not at flush: a page rendered before the commit would read the old
+    # rows and cache them under the new generation
+    namespaces = session.info.pop(_STALE_NAMESPACES, None)
+    if namespaces:
+        fragment_cache.invalidate(*namespaces)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_fragments(session):
+    session.info.pop(_STALE_NAMESPACES, None)
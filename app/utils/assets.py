@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+STATIC_SOURCE_DIR = "static"
+ASSET_BUILD_DIR = os.getenv("ASSET_BUILD_DIR", "static_build")
+STATIC_URL = "/static/"
+MANIFEST = "manifest.json"
+# Only text formats are worth compressing; images are compressed already
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".map", ".html", ".xml", ".ico"}
+# Encoding -> suffix of the precompressed file, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# Fingerprinted names change with their content, so they never need revalidating
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def fingerprint(path: str, data: bytes) -> str:
+    """`css/site.css` -> `css/site.<first 12 hex digits of its sha256>.css`"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+def _compress(data: bytes):
+    yield "gzip", gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield "br", brotli.compress(data, quality=11)
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def build_assets(source: str = STATIC_SOURCE_DIR, dest: str = ASSET_BUILD_DIR) -> dict:
+    """Copy every asset under `source` to `dest`, fingerprinted and precompressed.
+
+    Each file is written under its own name and under its fingerprinted
+    name, each with .gz (and, when brotli is installed, .br) variants
+    where compression pays off. The manifest maps logical names to
+    fingerprinted ones and lists the variants of every file; it is
+    replaced last, so a running server never sees a half-built tree.
+    Files of earlier builds are kept for pages still referencing them.
+    """
+    assets, encodings = {}, {}
+    for directory, _, files in os.walk(source):
+        for name in sorted(files):
+            full_path = os.path.join(directory, name)
+            path = os.path.relpath(full_path, source).replace(os.sep, "/")
+            with open(full_path, "rb") as f:
+                data = f.read()
+            hashed = fingerprint(path, data)
+            assets[path] = hashed
+            variants = []
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                for encoding, compressed in _compress(data):
+                    if len(compressed) < len(data):
+                        variants.append((encoding, compressed))
+            for target in (path, hashed):
+                _write(os.path.join(dest, target), data)
+                for encoding, compressed in variants:
+                    _write(os.path.join(dest, target + ENCODINGS[encoding]), compressed)
+                encodings[target] = sorted((encoding for encoding, _ in variants), key=list(ENCODINGS).index)
+
+    manifest = {"assets": assets, "encodings": encodings}
+    tmp_path = os.path.join(dest, MANIFEST + ".tmp")
+    _write(tmp_path, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    os.replace(tmp_path, os.path.join(dest, MANIFEST))
+    return manifest
+
+def load_manifest(directory: str = ASSET_BUILD_DIR) -> dict:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"assets": {}, "encodings": {}}
+
+def static_directory() -> str:
+    """The asset build when there is one, else the unbuilt sources"""
+    return ASSET_BUILD_DIR if os.path.exists(os.path.join(ASSET_BUILD_DIR, MANIFEST)) else STATIC_SOURCE_DIR
+
+_manifest = None
+
+def asset_url(path: str) -> str:
+    """URL of the fingerprinted build of `path`, or of `path` itself if it was not built"""
+    global _manifest
+    if _manifest is None:
+        _manifest = load_manifest()
+    return STATIC_URL + _manifest["assets"].get(path, path)
+
+def _accepted(accept_encoding: str) -> dict:
+    """Accept-Encoding as {coding: q}"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.lower()] = q
+    return accepted
+
+def negotiate(accept_encoding: str, available) -> str:
+    """Best of the `available` encodings the client accepts, or None"""
+    accepted = _accepted(accept_encoding or "")
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving the asset build's precompressed variants.
+
+    Picks the .br or .gz file matching Accept-Encoding when the build has
+    one, and marks fingerprinted files immutable.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        manifest = load_manifest(self.directory)
+        self.encodings = manifest["encodings"]
+        self.immutable = set(manifest["assets"].values())
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        path = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        available = self.encodings.get(path, ())
+        headers = {}
+        if available:
+            headers["Vary"] = "Accept-Encoding"
+        if path in self.immutable:
+            headers["Cache-Control"] = IMMUTABLE
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding"), available)
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            full_path = f"{full_path}{ENCODINGS[encoding]}"
+            stat_result = os.stat(full_path)
+        response = FileResponse(
+            full_path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,19 +1,110 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+import threading
+import time
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Request, HTTPException
 from fastapi.responses import RedirectResponse
 from functools import wraps
 import os
+from .metrics import timed
 
-# Configure password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Configure password hashing. Hashes made with a different cost are
+# flagged by needs_update() and rehashed on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
+
+# bcrypt releases the GIL while hashing, so a thread pool runs hashes in
+# parallel without blocking the event loop. Jobs beyond the queue limit
+# (running + waiting) are rejected at once instead of piling up.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending_hash_jobs = 0
+_pending_hash_lock = threading.Lock()
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing queue is full"""
 
 # Configure JWT
 SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
+ALGORITHM = os.getenv("ALGORITHM") or "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES") or 30)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+def _load_signing_keys() -> Tuple[Dict[str, str], Optional[str]]:
+    """Read the key ring from JWT_KEYS ("kid:secret,kid:secret") or SECRET_KEY"""
+    keys = {}
+    for entry in (os.getenv("JWT_KEYS") or "").split(","):
+        if ":" in entry:
+            kid, secret = entry.split(":", 1)
+            keys[kid.strip()] = secret.strip()
+    if not keys and SECRET_KEY:
+        keys["default"] = SECRET_KEY
+    active = os.getenv("JWT_ACTIVE_KEY_ID") or next(iter(keys), None)
+    return keys, active
+
+# Tokens are signed with the active key; every key in the ring is accepted
+_signing_keys, _active_key_id = _load_signing_keys()
+
+class TokenCache:
+    """Bounded LRU of verified token claims, each kept until its `exp`"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            claims, expires_at, kid = entry
+            if expires_at <= time.time() or kid not in _signing_keys:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: dict, kid: str):
+        with self._lock:
+            self._entries[token] = (claims, claims["exp"], kid)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_key(self, kid: str):
+        """Forget every token signed with `kid`"""
+        with self._lock:
+            for token in [token for token, entry in self._entries.items() if entry[2] == kid]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+def rotate_signing_keys(keys: Dict[str, str], active_key_id: str):
+    """Replace the key ring; tokens signed with dropped keys stop verifying"""
+    global _signing_keys, _active_key_id
+    if active_key_id not in keys:
+        raise ValueError(f"Active key '{active_key_id}' is not in the key ring")
+    retired = set(_signing_keys) - set(keys)
+    _signing_keys, _active_key_id = dict(keys), active_key_id
+    for kid in retired:
+        token_cache.discard_key(kid)
 
 def get_password_hash(password: str) -> str:
     """Hash a password using bcrypt"""
@@ -23,19 +114,75 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+def _release_hash_slot(future):
+    global _pending_hash_jobs
+    with _pending_hash_lock:
+        _pending_hash_jobs -= 1
+
+async def _run_hash_job(func, *args):
+    """Run a bcrypt call on the worker pool, or fail fast when it is saturated"""
+    global _pending_hash_jobs
+    with _pending_hash_lock:
+        if _pending_hash_jobs >= PASSWORD_HASH_QUEUE_LIMIT:
+            raise PasswordHasherBusy()
+        _pending_hash_jobs += 1
+    future = _hash_executor.submit(func, *args)
+    future.add_done_callback(_release_hash_slot)
+    with timed("hash"):
+        return await asyncio.wrap_future(future)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the worker pool"""
+    return await _run_hash_job(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the worker pool.
+
+    Returns (valid, new_hash); new_hash is set when the stored hash uses an
+    outdated cost and should be replaced.
+    """
+    valid, new_hash = await _run_hash_job(pwd_context.verify_and_update, plain_password, hashed_password)
+    return valid, new_hash
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create a JWT access token"""
+    """Create a JWT access token signed with the active key"""
+    if _active_key_id is None:
+        raise RuntimeError("No JWT signing key configured (set SECRET_KEY or JWT_KEYS)")
     to_encode = data.copy()
     
     # Set expiration
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(datetime.now(timezone.utc)) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(datetime.now(timezone.utc)) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt 
+    to_encode.update({"iat": now, "exp": expire})
+    encoded_jwt = jwt.encode(
+        to_encode,
+        _signing_keys[_active_key_id],
+        algorithm=ALGORITHM,
+        headers={"kid": _active_key_id}
+    )
+    return encoded_jwt
+
+def decode_access_token(token: str) -> dict:
+    """Verify a JWT and return its claims, serving repeats from the token cache.
+
+    Raises JWTError when the token is malformed, expired or signed with an
+    unknown key.
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid not in _signing_keys:
+        raise JWTError("Unknown signing key")
+    claims = jwt.decode(token, _signing_keys[kid], algorithms=[ALGORITHM])
+    if "exp" not in claims:
+        raise JWTError("Token has no expiry")
+    token_cache.put(token, claims, kid)
+    return claims
 
 def login_required(func):
     @wraps(func)
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+import json
+from fastapi import Request, Response
+
+# Pages behind a login: browsers may keep them but must revalidate every
+# time, and shared caches must not store them
+PRIVATE_REVALIDATE = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    """Weak ETag over the data a page is rendered from.
+
+    Weak because equal data renders to equivalent, not necessarily
+    byte-identical, pages.
+    """
+    payload = json.dumps(parts, default=str, sort_keys=True, separators=(",", ":")).encode()
+    return f'W/"{hashlib.sha1(payload).hexdigest()[:20]}"'
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC (or aware) datetime as an HTTP date"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def _opaque(etag: str) -> str:
+    return etag.strip().removeprefix("W/")
+
+def is_not_modified(request: Request, etag: str = None, last_modified: datetime = None) -> bool:
+    """Whether the client's cached copy is still current (RFC 9110, section 13.2.2).
+
+    If-None-Match takes precedence over If-Modified-Since and is compared
+    weakly; dates are compared at the one-second precision of HTTP dates.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def conditional_response(request: Request, render, etag: str = None, last_modified: datetime = None,
+                         cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    """Answer 304 if the client's copy is current, else call `render()`.
+
+    Both answers carry the validators and `cache_control`; the 304 never
+    renders the page.
+    """
+    headers = {"Cache-Control": cache_control, "Vary": "Cookie"}
+    if etag is not None:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if request.method in ("GET", "HEAD") and is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response = render()
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "1000"))
+FRAGMENT_CACHE_TTL = float(os.getenv("FRAGMENT_CACHE_TTL", "60"))
+
+def _make_key(key) -> str:
+    if isinstance(key, (list, tuple)):
+        return ":".join("" if part is None else str(part) for part in key)
+    return str(key)
+
+class FragmentCache:
+    """Bounded LRU of rendered template fragments with TTL and namespaces.
+
+    A key's namespace is the part before its first ':'. Invalidating a
+    namespace bumps its generation, which makes every fragment cached
+    under it stale at once.
+    """
+
+    def __init__(self, maxsize: int, default_ttl: float):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, ttl, render):
+        key = _make_key(key)
+        namespace = key.split(":", 1)[0]
+        with self._lock:
+            generation = self._generations.get(namespace, 0)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] == generation:
+                self._entries.move_to_end(key)
+                return entry[2]
+        value = render()
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, generation, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *namespaces):
+        """Drop every fragment cached under the given namespaces"""
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+fragment_cache = FragmentCache(FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_TTL)
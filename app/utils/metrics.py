@@ -0,0 +1,186 @@
+from contextvars import ContextVar
+import logging
+import os
+import threading
+import time
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+
+slow_query_logger = logging.getLogger("app.slow_query")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Time spent in each stage, reported in Server-Timing and summed per route
+STAGES = ("db", "render", "hash")
+_MAX_LOGGED_PARAMS = 1000
+
+class RequestTimings:
+    """What one request spent where; shared with every task and thread it spawns"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+
+_current = ContextVar("request_timings", default=None)
+
+def record(stage: str, seconds: float):
+    """Charge `seconds` of `stage` to the current request, if any"""
+    timings = _current.get()
+    if timings is not None:
+        timings.seconds[stage] += seconds
+
+class timed:
+    """Context manager charging the time spent in its block to a stage"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    timings = _current.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.seconds["db"] += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning(
+            "Slow query (%.1f ms): %s | parameters: %.*s",
+            elapsed * 1000, " ".join(statement.split()), _MAX_LOGGED_PARAMS, repr(parameters),
+        )
+
+def instrument_engine(engine):
+    """Time every statement of `engine` (sync or async) and log slow ones"""
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class InstrumentedTemplates(Jinja2Templates):
+    """Jinja2Templates that charges template rendering to the request"""
+
+    def TemplateResponse(self, *args, **kwargs):
+        with timed("render"):
+            return super().TemplateResponse(*args, **kwargs)
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.queries = 0
+
+class RouteMetrics:
+    """Per-route latency histograms and stage totals, rendered for Prometheus"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, timings: RequestTimings, seconds: float):
+        with self._lock:
+            histogram = self._histograms.setdefault((method, route, str(status)), _Histogram())
+            histogram.count += 1
+            histogram.sum += seconds
+            histogram.queries += timings.queries
+            for stage, value in timings.seconds.items():
+                histogram.stages[stage] += value
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram.buckets[i] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            lines = [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route, status), histogram in items:
+                labels = f'method="{method}",route="{_escape(route)}",status="{status}"'
+                for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram.count}")
+            lines += [
+                "# HELP http_request_stage_seconds_total Time spent in the database, template rendering and password hashing.",
+                "# TYPE http_request_stage_seconds_total counter",
+            ]
+            for (method, route, status), histogram in items:
+                for stage, value in histogram.stages.items():
+                    lines.append(
+                        f'http_request_stage_seconds_total{{method="{method}",route="{_escape(route)}",'
+                        f'status="{status}",stage="{stage}"}} {value:.6f}'
+                    )
+            lines += [
+                "# HELP http_request_db_queries_total SQL statements issued while serving requests.",
+                "# TYPE http_request_db_queries_total counter",
+            ]
+            for (method, route, status), histogram in items:
+                lines.append(
+                    f'http_request_db_queries_total{{method="{method}",route="{_escape(route)}",'
+                    f'status="{status}"}} {histogram.queries}'
+                )
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+route_metrics = RouteMetrics()
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    parts = [f'db;dur={timings.seconds["db"] * 1000:.1f};desc="{timings.queries} queries"']
+    parts += [f"{stage};dur={timings.seconds[stage] * 1000:.1f}" for stage in STAGES if stage != "db"]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+class RequestMetricsMiddleware:
+    """Times each HTTP request and reports it in Server-Timing and route_metrics.
+
+    Pure ASGI so streaming responses pass through untouched; the header
+    carries the timings collected until the response starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings, time.perf_counter() - timings.started)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            route_metrics.observe(
+                scope["method"], route.path if route else "<unmatched>", status,
+                timings, time.perf_counter() - timings.started,
+            )
@@ -0,0 +1,53 @@
+import base64
+import binascii
+from datetime import datetime
+import json
+from sqlalchemy import and_, or_
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor is malformed or belongs to another sort"""
+
+def encode_cursor(sort: str, value, row_id: int) -> str:
+    """Pack the last row's (sort value, id) into an opaque URL-safe token"""
+    if isinstance(value, datetime):
+        value = {"dt": value.isoformat()}
+    payload = json.dumps([sort, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str, sort: str):
+    """Unpack a cursor produced by encode_cursor for the same sort"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["dt"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor("Malformed cursor")
+    if cursor_sort != sort or not isinstance(row_id, int):
+        raise InvalidCursor("Cursor does not match the requested sort")
+    return value, row_id
+
+def keyset_paginate(query, sort: str, column, id_column, cursor=None, limit=20, descending=False, key=None):
+    """Return one page of `query` ordered by (column, id) and the next cursor.
+
+    Seeks past the previous page with a (column, id) comparison instead of
+    OFFSET, so every page costs one index range scan of `limit` rows.
+    `key(row)` must return the row's (sort value, id).
+    """
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, id_column > last_id)))
+    if descending:
+        query = query.order_by(column.desc(), id_column.desc())
+    else:
+        query = query.order_by(column.asc(), id_column.asc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, *key(rows[-1]))
+    return rows, next_cursor
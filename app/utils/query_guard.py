@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+
+class QueryCountGrew(AssertionError):
+    """Raised when the number of SQL statements depends on the number of rows"""
+
+@contextmanager
+def count_queries(engine):
+    """Collect every SQL statement `engine` executes inside the block.
+
+    Meant for tests and checks: the listener sees statements from all
+    sessions on the engine, not only the ones of the current request.
+    Route handlers query through `get_async_engine()`, so pass that one when
+    counting requests.
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def assert_constant_queries(engine, run, grow, sizes=(1, 10, 50)) -> int:
+    """Fail if `run()` issues more statements as `grow(n)` adds rows.
+
+    For each size, `grow(n)` brings the data to n rows and `run()` does
+    the work under test (a request, a service call); every run must issue
+    the same number of statements. Returns that number.
+    """
+    counts = {}
+    for size in sizes:
+        grow(size)
+        with count_queries(engine) as statements:
+            run()
+        counts[size] = len(statements)
+    if len(set(counts.values())) > 1:
+        raise QueryCountGrew(f"Statement count grows with the number of rows: {counts}")
+    return counts[sizes[0]]
+
+class PlanRegression(AssertionError):
+    """Raised when a query plan scans a whole table or sorts without an index"""
+
+@contextmanager
+def capture_selects(engine):
+    """Collect the (statement, parameters) of every SELECT `engine` executes inside the block"""
+    engine = getattr(engine, "sync_engine", engine)
+    selects = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")) and not executemany:
+            selects.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield selects
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def _sqlite_problems(conn, statement, parameters, tables):
+    problems = []
+    for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+        detail = row[-1]
+        words = [word for word in detail.split() if word != "TABLE"]  # SQLite < 3.36 says "SCAN TABLE books"
+        # "SCAN books" reads every row; "SCAN books USING INDEX ..." walks an index in order
+        if words[0] == "SCAN" and len(words) == 2 and words[1] in tables:
+            problems.append(f"full scan: {detail}")
+        elif detail.startswith("USE TEMP B-TREE"):
+            problems.append(f"sort without an index: {detail}")
+    return problems
+
+def _mysql_problems(conn, statement, parameters, tables):
+    problems = []
+    for row in conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings():
+        extra = row["Extra"] or ""
+        if row["type"] == "ALL" and row["table"] in tables:
+            problems.append(f"full scan of {row['table']} ({row['rows']} rows)")
+        if "Using filesort" in extra:
+            problems.append(f"filesort on {row['table']}: {extra}")
+    return problems
+
+def plan_problems(conn, statement: str, parameters, tables) -> list:
+    """Full scans of `tables` and index-less sorts in the plan of `statement`.
+
+    Uses EXPLAIN on MySQL and EXPLAIN QUERY PLAN on SQLite, with the same
+    parameters the statement ran with. Scans of tables outside `tables`
+    (small lookup tables, derived tables) are not reported.
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        return _sqlite_problems(conn, statement, parameters, tables)
+    if dialect == "mysql":
+        return _mysql_problems(conn, statement, parameters, tables)
+    raise NotImplementedError(f"No plan checks for {dialect}")
+
+def assert_indexed_plans(engine, run, tables, allow_sorts: bool = False) -> int:
+    """Fail if a SELECT issued by `run()` fully scans one of `tables` or sorts without an index.
+
+    Each distinct statement is explained once, with the parameters of its
+    first execution. `allow_sorts` accepts sorts without an index, for
+    queries that rank an already bounded set of rows by a computed value.
+    Returns the number of distinct statements checked.
+    """
+    with capture_selects(engine) as selects:
+        run()
+    statements = {}
+    for statement, parameters in selects:
+        statements.setdefault(statement, parameters)
+    problems = []
+    with getattr(engine, "sync_engine", engine).connect() as conn:
+        for statement, parameters in statements.items():
+            problems.extend(
+                f"{problem}\n    {' '.join(statement.split())}"
+                for problem in plan_problems(conn, statement, parameters, tables)
+                if not (allow_sorts and problem.startswith(("sort", "filesort")))
+            )
+    if problems:
+        raise PlanRegression("\n  ".join(["Query plans without a usable index:", *problems]))
+    return len(statements)
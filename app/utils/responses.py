@@ -0,0 +1,32 @@
+from datetime import date, datetime
+import enum
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # listed in requirements; the stdlib encoder is a fallback
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(content) -> bytes:
+    """Compact JSON; datetimes as ISO 8601 and enums as their values either way"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson when it is installed.
+
+    Only skips FastAPI's jsonable_encoder when the handler returns it
+    directly rather than returning the content.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,19 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def run_periodically(interval: float, job, *args):
+    """Run a job every `interval` seconds without blocking the event loop.
+
+    Blocking jobs run in a thread; coroutine functions on the loop itself.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if asyncio.iscoroutinefunction(job):
+                await job(*args)
+            else:
+                await asyncio.to_thread(job, *args)
+        except Exception:
+            logger.exception("Periodic job %s failed", getattr(job, "__name__", job))
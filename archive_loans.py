@@ -0,0 +1,24 @@
+import argparse
+from app.database.connection import SessionLocal
+from app.services import archive
+
+def archive_loans(older_than_days: int = None, batch_size: int = None):
+    db = SessionLocal()
+    try:
+        totals = archive.archive_loans(db, older_than_days=older_than_days, batch_size=batch_size)
+        print("Loans archived successfully!")
+        for name, value in totals.items():
+            print(f"{name}: {value}")
+    except Exception as e:
+        print(f"Error archiving loans: {e}")
+        raise SystemExit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old returned loans to the loan archive")
+    parser.add_argument("--older-than-days", type=int, help="archive loans borrowed more than this many days ago (default LOAN_ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--batch-size", type=int, help="loans moved per transaction (default LOAN_ARCHIVE_BATCH_SIZE)")
+    args = parser.parse_args()
+    print("Archiving loans...")
+    archive_loans(args.older_than_days, args.batch_size)
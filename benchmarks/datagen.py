@@ -0,0 +1,239 @@
+"""Synthetic library data for benchmarks and load tests.
+
+Fills an empty database with books, members and loans at the requested
+scale using batched INSERTs into the app's tables, then rebuilds what
+the app derives from them: book availability, the search index, the
+dashboard counters and, optionally, fines. The same seed always yields
+the same data, so runs at the same scale are comparable.
+
+    python -m benchmarks.datagen --url sqlite:///bench.db --reset --books 1000000 --members 200000 --loans 10000000
+
+Members are `member1` ... `memberN` and the admin is `bench_admin`, all
+with the password `bench123` (hashed once, with BCRYPT_ROUNDS rounds).
+Book ids run from 1 to the number of books.
+"""
+import argparse
+from array import array
+from datetime import timedelta
+import json
+import random
+import time
+from sqlalchemy import bindparam, create_engine, func, insert, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from app.database.migrate import migrate
+from app.database.models import Base, Book, BookLoan, Category, User, UserRole, utcnow
+from app.services import fines, search, stats
+from app.utils.auth import get_password_hash
+from benchmarks.search_bench import CATEGORIES, FIRST_NAMES, LAST_NAMES, zipf_word
+
+PASSWORD = "bench123"
+ADMIN_USERNAME = "bench_admin"
+LOAN_DAYS = 14
+
+def member_username(n: int) -> str:
+    return f"member{n}"
+
+def book_copies(book_id: int) -> int:
+    """1 to 5 copies, fixed per book so loans can be planned before books are read back"""
+    return 1 + book_id * 2654435761 % 5
+
+class Progress:
+    def __init__(self, label: str, total: int):
+        self.label, self.total = label, total
+        self.started = self.reported = time.perf_counter()
+
+    def update(self, done: int):
+        now = time.perf_counter()
+        if now - self.reported >= 2 or done >= self.total:
+            self.reported = now
+            rate = done / max(now - self.started, 1e-9)
+            print(f"  {self.label}: {done}/{self.total} ({rate:,.0f} rows/s)", flush=True)
+
+def _batches(total: int, size: int):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+def generate_categories(db: Session) -> list:
+    rows = [{"name": name, "created_at": utcnow(), "updated_at": utcnow(), "is_deleted": False} for name in CATEGORIES]
+    db.connection().execute(insert(Category), rows)
+    return list(db.connection().execute(select(Category.id).order_by(Category.id)).scalars())
+
+def generate_books(db: Session, books: int, category_ids, rng, now, batch_size: int, index: bool):
+    progress = Progress("books", books)
+    for start, end in _batches(books, batch_size):
+        conn = db.connection()
+        rows = []
+        for book_id in range(start + 1, end + 1):
+            copies = book_copies(book_id)
+            created = now - timedelta(days=rng.randint(0, 3650))
+            rows.append({
+                "id": book_id,
+                "title": " ".join(zipf_word(rng) for _ in range(rng.randint(2, 5))).title(),
+                "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}".title(),
+                "publisher": f"{rng.choice(LAST_NAMES).title()} Press",
+                "publication_year": rng.randint(1900, now.year),
+                "isbn": f"979{book_id:010d}",
+                "category_id": rng.choice(category_ids),
+                "total_copies": copies,
+                "available_copies": copies,
+                "created_at": created,
+                "updated_at": created,
+                "is_deleted": False,
+            })
+        conn.execute(insert(Book), rows)
+        if index:
+            search.index_books(conn, [row["id"] for row in rows])
+        db.commit()
+        progress.update(end)
+
+def generate_members(db: Session, members: int, rng, now, batch_size: int):
+    hashed = get_password_hash(PASSWORD)
+    db.connection().execute(insert(User), [{
+        "id": 1, "username": ADMIN_USERNAME, "email": f"{ADMIN_USERNAME}@bench.example",
+        "hashed_password": hashed, "role": UserRole.ADMIN, "first_name": "Bench", "last_name": "Admin",
+        "created_at": now, "updated_at": now, "is_deleted": False,
+    }])
+    progress = Progress("members", members)
+    for start, end in _batches(members, batch_size):
+        rows = []
+        for n in range(start + 1, end + 1):
+            joined = now - timedelta(days=rng.randint(0, 1825), seconds=rng.randint(0, 86399))
+            rows.append({
+                "id": n + 1,
+                "username": member_username(n),
+                "email": f"{member_username(n)}@bench.example",
+                "hashed_password": hashed,
+                "role": UserRole.MEMBER,
+                "first_name": rng.choice(FIRST_NAMES).title(),
+                "last_name": rng.choice(LAST_NAMES).title(),
+                "phone": f"+1555{n:07d}"[:20],
+                "created_at": joined,
+                "updated_at": joined,
+                "is_deleted": False,
+            })
+        db.connection().execute(insert(User), rows)
+        db.commit()
+        progress.update(end)
+
+def generate_loans(db: Session, loans: int, books: int, members: int, rng, now, batch_size: int,
+                   history_days: int, open_ratio: float, late_ratio: float):
+    """Loans over the last `history_days`; returns how many copies of each book are out.
+
+    Loans of the last LOAN_DAYS * 2 days stay open with probability
+    `open_ratio` as long as a copy is free; older ones are returned, a
+    `late_ratio` share of them after the due date.
+    """
+    open_copies = array("B", bytes(books + 1))
+    progress = Progress("loans", loans)
+    for start, end in _batches(loans, batch_size):
+        rows = []
+        for _ in range(start, end):
+            book_id = rng.randint(1, books)
+            borrowed = now - timedelta(days=rng.random() * history_days)
+            due = borrowed + timedelta(days=LOAN_DAYS)
+            recent = now - borrowed < timedelta(days=LOAN_DAYS * 2)
+            if recent and open_copies[book_id] < book_copies(book_id) and rng.random() < open_ratio:
+                open_copies[book_id] += 1
+                returned = None
+            else:
+                days = rng.uniform(LOAN_DAYS, LOAN_DAYS + 20) if rng.random() < late_ratio else rng.uniform(1, LOAN_DAYS)
+                returned = min(borrowed + timedelta(days=days), now)
+            rows.append({
+                "user_id": rng.randint(2, members + 1),
+                "book_id": book_id,
+                "borrowed_date": borrowed,
+                "due_date": due,
+                "returned_date": returned,
+                "is_returned": returned is not None,
+                "fine_amount": 0,
+                "created_at": borrowed,
+                "updated_at": returned or borrowed,
+                "is_deleted": False,
+            })
+        db.connection().execute(insert(BookLoan), rows)
+        db.commit()
+        progress.update(end)
+    return open_copies
+
+def apply_availability(db: Session, open_copies, batch_size: int) -> int:
+    """Take the copies out on open loans off each book's available copies"""
+    changed = [
+        {"b_id": book_id, "available": book_copies(book_id) - count}
+        for book_id, count in enumerate(open_copies) if count
+    ]
+    statement = update(Book).where(Book.id == bindparam("b_id")).values(available_copies=bindparam("available"))
+    for start, end in _batches(len(changed), batch_size):
+        db.connection().execute(statement, changed[start:end])
+        db.commit()
+    return len(changed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///bench.db")
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--members", type=int, default=20_000)
+    parser.add_argument("--loans", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--open-ratio", type=float, default=0.5, help="share of recent loans still out")
+    parser.add_argument("--late-ratio", type=float, default=0.1, help="share of returns after the due date")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    parser.add_argument("--skip-search-index", action="store_true")
+    parser.add_argument("--compute-fines", action="store_true", help="also compute fines for every loan")
+    args = parser.parse_args()
+
+    options = {}
+    if make_url(args.url).get_backend_name() == "sqlite":
+        options["connect_args"] = {"timeout": 60}
+    engine = create_engine(args.url, **options)
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    migrate(engine)
+
+    rng = random.Random(args.seed)
+    now = utcnow()
+    timings = {}
+    with Session(engine) as db:
+        if db.query(func.count(Book.id)).scalar() or db.query(func.count(User.id)).scalar():
+            raise SystemExit("The database already has books or users; pass --reset to start over")
+
+        started = time.perf_counter()
+        generate_books(db, args.books, generate_categories(db), rng, now, args.batch_size, not args.skip_search_index)
+        timings["books_s"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        generate_members(db, args.members, rng, now, args.batch_size)
+        timings["members_s"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        open_copies = generate_loans(
+            db, args.loans, args.books, args.members, rng, now, args.batch_size,
+            args.history_days, args.open_ratio, args.late_ratio,
+        )
+        books_out = apply_availability(db, open_copies, args.batch_size)
+        timings["loans_s"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        counters = stats.reconcile(db, now)
+        db.commit()
+        if args.compute_fines:
+            counters["fines"] = fines.compute_fines(db, now, full=True)
+        timings["derived_s"] = time.perf_counter() - started
+
+    engine.dispose()
+    print(json.dumps({
+        "url": make_url(args.url).render_as_string(hide_password=True),
+        "seed": args.seed,
+        "books": args.books,
+        "members": args.members,
+        "loans": args.loans,
+        "open_loans": sum(open_copies),
+        "books_with_copies_out": books_out,
+        "counters": counters,
+        "elapsed_s": {name: round(value, 1) for name, value in timings.items()},
+    }, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
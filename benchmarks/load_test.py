@@ -0,0 +1,259 @@
+"""HTTP load test of the member flows: login, dashboard, catalog, search and checkout.
+
+Each virtual user logs in as its own member (see benchmarks.datagen) and
+then runs a weighted mix of page views, searches and borrow/return
+cycles against a running server, or against one it starts itself with
+--spawn. Reports p50/p95/p99 latency, errors and throughput per operation
+as JSON; with --baseline, also the change against an earlier report.
+
+    python -m benchmarks.datagen --url sqlite:///bench.db --reset
+    python -m benchmarks.load_test --spawn --url sqlite:///bench.db --users 50 --duration 60 --output run.json
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --baseline run.json
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.datagen import PASSWORD, member_username
+from benchmarks.search_bench import FIRST_NAMES, WORDS, zipf_word
+from benchmarks.startup_bench import _free_port
+
+# Operation -> relative weight in the mix after login
+MIX = {
+    "dashboard": 20,
+    "catalog": 25,
+    "catalog_next_page": 10,
+    "search": 20,
+    "autocomplete": 15,
+    "checkout": 10,
+}
+SORTS = ("title", "author", "created_at", "availability")
+_NEXT_CURSOR = re.compile(r'href="\?sort=[a-z_]+&cursor=([A-Za-z0-9_-]+)"')
+_RETURN_FORM = re.compile(r'action="/member/loans/(\d+)/return"')
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, operation: str, seconds: float, ok: bool):
+        if ok:
+            self.samples.setdefault(operation, []).append(seconds)
+        else:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+def percentile(samples, p: float) -> float:
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+def summarize(samples, errors: int, elapsed: float) -> dict:
+    samples = sorted(samples)
+    summary = {"requests": len(samples), "errors": errors, "throughput_rps": round(len(samples) / elapsed, 1)}
+    if samples:
+        summary.update({
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+            "max_ms": round(samples[-1] * 1000, 2),
+        })
+    return summary
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, member: int, books: int, rng: random.Random):
+        self.client, self.recorder, self.member, self.books, self.rng = client, recorder, member, books, rng
+        self.cursor = None
+        self.sort = "title"
+
+    async def request(self, operation: str, method: str, url: str, ok_statuses=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            ok = response.status_code in ok_statuses
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.recorder.add(operation, time.perf_counter() - started, ok)
+        return response if ok else None
+
+    async def login(self) -> bool:
+        response = await self.request("login", "POST", "/auth/login", ok_statuses=(303,), data={
+            "username_or_email": member_username(self.member), "password": PASSWORD,
+        })
+        return response is not None and response.headers.get("location") == "/"
+
+    async def dashboard(self):
+        await self.request("dashboard", "GET", "/member/dashboard")
+
+    async def catalog(self):
+        self.sort = self.rng.choice(SORTS)
+        response = await self.request("catalog", "GET", "/member/books", params={"sort": self.sort})
+        self._remember_cursor(response)
+
+    async def catalog_next_page(self):
+        if not self.cursor:
+            return await self.catalog()
+        response = await self.request("catalog_next_page", "GET", "/member/books",
+                                      params={"sort": self.sort, "cursor": self.cursor})
+        self._remember_cursor(response)
+
+    def _remember_cursor(self, response):
+        match = _NEXT_CURSOR.search(response.text) if response is not None else None
+        self.cursor = match.group(1) if match else None
+
+    async def search(self):
+        if self.rng.random() < 0.2:
+            q = f"{self.rng.choice(FIRST_NAMES)}"
+        else:
+            q = " ".join(zipf_word(self.rng) for _ in range(self.rng.randint(1, 2)))
+        await self.request("search", "GET", "/member/books", params={"q": q, "page": self.rng.randint(1, 3)})
+
+    async def autocomplete(self):
+        word = self.rng.choice(WORDS[:2000])
+        await self.request("autocomplete", "GET", "/member/books/autocomplete",
+                           params={"q": word[:self.rng.randint(2, 4)]})
+
+    async def checkout(self):
+        """Borrow a random book, then return whatever the member has out to keep stock steady"""
+        book_id = self.rng.randint(1, self.books)
+        await self.request("checkout", "POST", f"/member/books/{book_id}/borrow", ok_statuses=(303,))
+        response = await self.request("dashboard", "GET", "/member/dashboard")
+        for loan_id in _RETURN_FORM.findall(response.text if response is not None else ""):
+            await self.request("return", "POST", f"/member/loans/{loan_id}/return", ok_statuses=(303,))
+
+    async def run(self, deadline: float, think_time: float):
+        if not await self.login():
+            return
+        operations = list(MIX)
+        weights = list(MIX.values())
+        while time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(operations, weights)[0])()
+            if think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / think_time))
+
+async def run_load(base_url: str, users: int, members: int, books: int, duration: float,
+                   ramp_up: float, think_time: float, seed: int) -> dict:
+    recorder = Recorder()
+    rng = random.Random(seed)
+    picked = rng.sample(range(1, members + 1), min(users, members))
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+
+    async def user(i: int, member: int):
+        await asyncio.sleep(ramp_up * i / max(users, 1))
+        async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+            await VirtualUser(client, recorder, member, books, random.Random(seed + i)).run(deadline, think_time)
+
+    started = time.perf_counter()
+    deadline = started + ramp_up + duration
+    await asyncio.gather(*(user(i, member) for i, member in enumerate(picked)))
+    elapsed = time.perf_counter() - started
+
+    operations = sorted(set(recorder.samples) | set(recorder.errors))
+    everything = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        "operations": {
+            operation: summarize(recorder.samples.get(operation, []), recorder.errors.get(operation, 0), elapsed)
+            for operation in operations
+        },
+        "total": summarize(everything, sum(recorder.errors.values()), elapsed),
+        "elapsed_s": round(elapsed, 1),
+    }
+
+def compare(report: dict, baseline: dict) -> dict:
+    """Relative change of p50/p95/p99 and throughput per operation (+0.10 = 10% higher)"""
+    changes = {}
+    for operation, current in {**report["operations"], "total": report["total"]}.items():
+        before = baseline["operations"].get(operation) if operation != "total" else baseline.get("total")
+        if not before:
+            continue
+        changes[operation] = {
+            key: round(current[key] / before[key] - 1, 3)
+            for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+            if current.get(key) and before.get(key)
+        }
+    return changes
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def spawn_server(url: str, workers: int, timeout: float = 60.0, env: dict = None):
+    """Start uvicorn against `url` and wait until it answers; returns (process, base URL)
+
+    `env` adds to the server's environment, e.g. to tune its settings.
+    """
+    port = _free_port()
+    env = {**os.environ, **(env or {}), "DATABASE_URL": url}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise SystemExit(f"uvicorn exited with status {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/auth/login", timeout=1.0).status_code == 200:
+                return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise SystemExit(f"uvicorn did not answer within {timeout}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn on --url instead of using --base-url")
+    parser.add_argument("--url", default="sqlite:///bench.db", help="database the spawned server uses")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when spawning")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--members", type=int, default=20_000, help="members generated by datagen")
+    parser.add_argument("--books", type=int, default=100_000, help="books generated by datagen")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load after ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=5.0)
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's requests")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    server, base_url = spawn_server(args.url, args.workers) if args.spawn else (None, args.base_url)
+    try:
+        results = asyncio.run(run_load(
+            base_url, args.users, args.members, args.books, args.duration, args.ramp_up, args.think_time, args.seed,
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            key: getattr(args, key)
+            for key in ("users", "members", "books", "duration", "ramp_up", "think_time", "seed", "workers", "spawn")
+        },
+        **results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["change_vs_baseline"] = compare(report, json.load(f))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
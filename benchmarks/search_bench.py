@@ -0,0 +1,136 @@
+"""Catalog search latency benchmark.
+
+Builds a synthetic catalog, indexes it with the same code the app uses and
+reports latency percentiles for ranked search and autocomplete.
+
+    python -m benchmarks.search_bench --books 1000000 --queries 2000
+
+By default the catalog is written to a throwaway SQLite file; pass --url to
+run against MySQL instead (the tables are created if missing).
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+from app.database.connection import Base
+from app.database.models import Book, Category
+from app.services import search
+
+COMMON_WORDS = (
+    "python data science history river garden winter empire ocean light shadow machine learning "
+    "design systems network journey silent kingdom music theory modern ancient secret city night "
+    "children stories world war love death island mountain mystery physics chemistry biology art "
+    "poetry cooking travel economics philosophy memory dream fire stone glass iron golden summer"
+).split()
+SYLLABLES = "ka lo mi ren sa tor vel an is du ph or ex th el qu ri na mo li be ta".split()
+FIRST_NAMES = "john jane mike sarah tom anna david maria peter linh quan minh lucas emma".split()
+LAST_NAMES = "smith doe wilson brown davis nguyen tran johnson miller garcia lee martin".split()
+CATEGORIES = "fiction science history programming poetry travel cooking biography art children".split()
+
+def build_vocabulary(size, seed=1):
+    """Common words followed by a long tail of pseudo-words"""
+    rng = random.Random(seed)
+    words = list(COMMON_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+WORDS = build_vocabulary(20_000)
+
+def zipf_word(rng):
+    # Skewed word frequencies, like real titles
+    index = min(int(rng.paretovariate(0.8)) - 1, len(WORDS) - 1)
+    return WORDS[index]
+
+def generate(engine, books, batch_size=5000, seed=42):
+    rng = random.Random(seed)
+    with Session(engine) as db:
+        existing = db.query(func.count(Book.id)).scalar()
+        if existing >= books:
+            return
+        category_ids = []
+        for name in CATEGORIES:
+            category = db.query(Category).filter(Category.name == name).first() or Category(name=name)
+            db.add(category)
+            db.flush()
+            category_ids.append(category.id)
+        db.commit()
+
+        for start in range(existing, books, batch_size):
+            conn = db.connection()
+            rows = [
+                {
+                    "title": " ".join(zipf_word(rng) for _ in range(rng.randint(2, 5))).title(),
+                    "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}".title(),
+                    "publisher": f"{rng.choice(LAST_NAMES).title()} Press",
+                    "isbn": f"978{n:010d}",
+                    "category_id": rng.choice(category_ids),
+                    "total_copies": 3,
+                    "available_copies": 3,
+                }
+                for n in range(start, min(start + batch_size, books))
+            ]
+            conn.execute(insert(Book), rows)
+            ids = conn.execute(select(Book.id).where(Book.isbn.in_([row["isbn"] for row in rows]))).scalars().all()
+            search.index_books(conn, ids)
+            db.commit()
+            print(f"  generated {start + len(rows)}/{books} books", flush=True)
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda p: samples[min(int(len(samples) * p), len(samples) - 1)]
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+    }
+
+def run(engine, queries, seed=7):
+    rng = random.Random(seed)
+    results = {}
+    with Session(engine) as db:
+        workloads = {
+            "search_one_term": lambda: search.search_books(db, zipf_word(rng)),
+            "search_two_terms": lambda: search.search_books(db, f"{zipf_word(rng)} {zipf_word(rng)}"),
+            "search_deep_page": lambda: search.search_books(db, zipf_word(rng), page=rng.randint(5, 50)),
+            "search_author": lambda: search.search_books(db, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"),
+            "autocomplete": lambda: search.autocomplete(db, rng.choice(WORDS)[:rng.randint(2, 4)]),
+        }
+        for name, workload in workloads.items():
+            workload()  # warm up caches
+            samples = []
+            for _ in range(queries):
+                started = time.perf_counter()
+                workload()
+                samples.append(time.perf_counter() - started)
+            results[name] = percentiles(samples)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///search_bench.db")
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--target-p99-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    Base.metadata.create_all(bind=engine)
+    generate(engine, args.books)
+    results = run(engine, args.queries)
+    print(json.dumps({"books": args.books, "queries": args.queries, "results": results}, indent=2))
+
+    slow = [name for name, stats in results.items() if stats["p99_ms"] > args.target_p99_ms]
+    if slow:
+        raise SystemExit(f"p99 above {args.target_p99_ms} ms for: {', '.join(slow)}")
+
+if __name__ == "__main__":
+    main()
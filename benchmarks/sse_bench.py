@@ -0,0 +1,197 @@
+"""Concurrent subscriber benchmark for the member event stream (/member/events).
+
+Opens --subscribers event streams, spread over --members logged-in members
+(see benchmarks.datagen), against a running server or one started with
+--spawn. Once every stream is open, it marks a hold ready for each of
+those members straight in the database. It then measures how long each
+stream takes to receive its hold_ready event. Reports the connect time,
+the delivery latency percentiles, the streams that got nothing, the
+server's memory per stream (spawned servers only) and its sse_* metrics,
+as JSON.
+
+    python -m benchmarks.datagen --url sqlite:///bench.db --reset --books 10000 --members 1000 --loans 50000
+    python -m benchmarks.sse_bench --spawn --url sqlite:///bench.db --subscribers 5000 --members 100
+
+Each stream is an open socket on both ends, so raise `ulimit -n` above
+twice --subscribers first. The marked holds are removed again afterwards.
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import json
+import time
+import httpx
+from sqlalchemy import create_engine, delete, insert, select
+from app.database.models import Reservation, ReservationStatus, User
+from benchmarks.datagen import ADMIN_USERNAME, PASSWORD, member_username
+from benchmarks.load_test import percentile, spawn_server
+
+def _rss_kb(pid: int):
+    """Resident memory of a process in KiB, where /proc has it"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+async def login(base_url: str, username: str, limits: httpx.Limits) -> httpx.AsyncClient:
+    client = httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(30.0, read=None), limits=limits)
+    response = await client.post("/auth/login", data={"username_or_email": username, "password": PASSWORD})
+    if response.status_code not in (200, 303) or "session" not in client.cookies:
+        await client.aclose()
+        raise SystemExit(f"Could not log in as {username}")
+    return client
+
+class Stream:
+    """One open event stream, noting when it connected and when its hold_ready event came"""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.connected = asyncio.Event()
+        self.received = asyncio.Event()
+        self.connected_at = self.received_at = None
+        self.status = None
+
+    async def run(self):
+        try:
+            async with self.client.stream("GET", "/member/events") as response:
+                self.status = response.status_code
+                if response.status_code != 200:
+                    return
+                kind = None
+                async for line in response.aiter_lines():
+                    if line.startswith("retry:") and not self.connected.is_set():
+                        self.connected_at = time.perf_counter()
+                        self.connected.set()
+                    elif line.startswith("event:"):
+                        kind = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:") and kind == "hold_ready" and not self.received.is_set():
+                        self.received_at = time.perf_counter()
+                        self.received.set()
+        except httpx.HTTPError:
+            pass
+        finally:
+            self.connected.set()
+
+async def fetch_metrics(base_url: str) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        await client.post("/auth/login", data={"username_or_email": ADMIN_USERNAME, "password": PASSWORD})
+        response = await client.get("/admin/metrics")
+    return {
+        name: float(value)
+        for name, _, value in (line.partition(" ") for line in response.text.splitlines())
+        if name.startswith("sse_")
+    }
+
+async def run_bench(base_url: str, url: str, subscribers: int, members: int, book_id: int,
+                    connect_timeout: float, delivery_timeout: float, server_pid: int = None) -> dict:
+    limits = httpx.Limits(max_connections=subscribers, max_keepalive_connections=0)
+    clients = [await login(base_url, member_username(n), limits) for n in range(1, members + 1)]
+    rss_before = _rss_kb(server_pid) if server_pid else None
+
+    streams = [Stream(clients[i % members]) for i in range(subscribers)]
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(stream.run()) for stream in streams]
+    try:
+        await asyncio.wait_for(asyncio.gather(*(stream.connected.wait() for stream in streams)), connect_timeout)
+    except asyncio.TimeoutError:
+        pass
+    open_streams = [stream for stream in streams if stream.connected_at is not None]
+    connect_s = max((stream.connected_at for stream in open_streams), default=started) - started
+    rss_after = _rss_kb(server_pid) if server_pid else None
+
+    engine = create_engine(url)
+    usernames = [member_username(n) for n in range(1, members + 1)]
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with engine.begin() as conn:
+        user_ids = conn.execute(select(User.id).where(User.username.in_(usernames))).scalars().all()
+        published = time.perf_counter()
+        result = conn.execute(insert(Reservation).returning(Reservation.id), [
+            {
+                "user_id": user_id, "book_id": book_id, "status": ReservationStatus.READY, "priority": 0,
+                "ready_at": now, "expires_at": now, "created_at": now, "updated_at": now, "is_deleted": False,
+            }
+            for user_id in user_ids
+        ])
+        hold_ids = result.scalars().all()
+    try:
+        await asyncio.wait_for(asyncio.gather(*(stream.received.wait() for stream in open_streams)), delivery_timeout)
+    except asyncio.TimeoutError:
+        pass
+    latencies = sorted(stream.received_at - published for stream in open_streams if stream.received_at)
+    metrics = await fetch_metrics(base_url)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for client in clients:
+        await client.aclose()
+    with engine.begin() as conn:
+        conn.execute(delete(Reservation).where(Reservation.id.in_(hold_ids)))
+    engine.dispose()
+
+    report = {
+        "streams_opened": len(open_streams),
+        "streams_refused": sum(1 for stream in streams if stream.status == 503),
+        "connect_s": round(connect_s, 2),
+        "delivered": len(latencies),
+        "missed": len(open_streams) - len(latencies),
+        "server_metrics": metrics,
+    }
+    if latencies:
+        report["delivery_ms"] = {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1),
+        }
+    if rss_before and rss_after and open_streams:
+        report["server_rss_kb"] = {
+            "before": rss_before,
+            "with_streams": rss_after,
+            "per_stream": round((rss_after - rss_before) / len(open_streams), 1),
+        }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn on --url instead of using --base-url")
+    parser.add_argument("--url", default="sqlite:///bench.db", help="database the server uses; holds are written to it")
+    parser.add_argument("--subscribers", type=int, default=1000, help="event streams to open")
+    parser.add_argument("--members", type=int, default=50, help="members the streams are spread over")
+    parser.add_argument("--book-id", type=int, default=1, help="book the marked holds are for")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="SSE_POLL_INTERVAL of a spawned server")
+    parser.add_argument("--connect-timeout", type=float, default=60.0)
+    parser.add_argument("--delivery-timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="also write the report to this file")
+    args = parser.parse_args()
+
+    server, base_url = (None, args.base_url)
+    if args.spawn:
+        server, base_url = spawn_server(args.url, 1, env={
+            "SSE_POLL_INTERVAL": str(args.poll_interval),
+            "SSE_MAX_CONNECTIONS": str(max(args.subscribers, 1)),
+        })
+    try:
+        report = asyncio.run(run_bench(
+            base_url, args.url, args.subscribers, args.members, args.book_id,
+            args.connect_timeout, args.delivery_timeout, server.pid if server else None,
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report["config"] = {
+        key: getattr(args, key) for key in ("subscribers", "members", "poll_interval", "spawn")
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
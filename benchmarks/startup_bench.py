@@ -0,0 +1,116 @@
+"""Startup benchmark: import time of the app and time to first request.
+
+Imports the app in fresh interpreters and checks that the import stays
+within a time budget and has no side effects (no engine created, no
+database driver loaded). Then starts uvicorn the way production does and
+measures how long it takes until the first request is answered. Exits
+with status 1 when the import budget is exceeded or the import touched
+the database, so it can gate CI.
+
+    python -m benchmarks.startup_bench --workers 4 --import-budget-ms 1500
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+from app.database import connection
+print(json.dumps({{
+    "import_s": elapsed,
+    "engines_created": sorted(connection._engines),
+    "drivers_loaded": sorted(name for name in ("pymysql", "aiomysql") if name in sys.modules),
+    "modules": len(sys.modules),
+}}))
+"""
+
+def measure_import(module: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE.format(module=module)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_request(app: str, workers: int, path: str, timeout: float) -> float:
+    """Seconds from spawning uvicorn until `path` answers with a non-5xx status"""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+                try:
+                    if client.get(path).status_code < 500:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        raise TimeoutError(f"No response from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app.main:app", help="ASGI app to start, as module:attribute")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--path", default="/auth/login", help="first request; should not need the database")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--import-budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--skip-server", action="store_true", help="only check the import")
+    args = parser.parse_args()
+
+    module = args.app.split(":", 1)[0]
+    imports = [measure_import(module) for _ in range(args.runs)]
+    import_ms = [probe["import_s"] * 1000 for probe in imports]
+    results = {
+        "app": args.app,
+        "import_ms": {
+            "median": round(statistics.median(import_ms), 1),
+            "max": round(max(import_ms), 1),
+            "budget": args.import_budget_ms,
+        },
+        "modules_loaded": imports[-1]["modules"],
+        "engines_created_at_import": imports[-1]["engines_created"],
+        "drivers_loaded_at_import": imports[-1]["drivers_loaded"],
+    }
+    if not args.skip_server:
+        ttfr = [time_to_first_request(args.app, args.workers, args.path, args.timeout) * 1000 for _ in range(args.runs)]
+        results["time_to_first_request_ms"] = {
+            "workers": args.workers,
+            "median": round(statistics.median(ttfr), 1),
+            "max": round(max(ttfr), 1),
+        }
+
+    failures = []
+    if results["import_ms"]["median"] > args.import_budget_ms:
+        failures.append(f"import took {results['import_ms']['median']} ms, over the {args.import_budget_ms} ms budget")
+    if results["engines_created_at_import"] or results["drivers_loaded_at_import"]:
+        failures.append("importing the app created an engine or loaded a database driver")
+    results["failures"] = failures
+    print(json.dumps(results, indent=2))
+    if failures:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
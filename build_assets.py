@@ -0,0 +1,16 @@
+import argparse
+from app.utils import assets
+
+def build(source: str, dest: str):
+    manifest = assets.build_assets(source, dest)
+    print(f"Built {len(manifest['assets'])} assets into {dest}")
+    if assets.brotli is None:
+        print("brotli is not installed; only gzip variants were written")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress the static assets")
+    parser.add_argument("--source", default=assets.STATIC_SOURCE_DIR)
+    parser.add_argument("--dest", default=assets.ASSET_BUILD_DIR)
+    args = parser.parse_args()
+    print("Building static assets...")
+    build(args.source, args.dest)
@@ -0,0 +1,25 @@
+import argparse
+from app.database.connection import get_engine
+from app.services import recommendations
+
+def build_recommendations(path: str, top_k: int):
+    try:
+        with get_engine().connect() as conn:
+            totals = recommendations.build(conn, path, top_k)
+        print(f"Recommendations written to {path}")
+        for name, value in totals.items():
+            print(f"{name}: {value}")
+    except recommendations.RecommendationsUnavailable as e:
+        print(e)
+        raise SystemExit(1)
+    except Exception as e:
+        print(f"Error building recommendations: {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Precompute "readers also borrowed" for every book')
+    parser.add_argument("--output", default=recommendations.RECOMMENDATIONS_PATH, help="artifact to write (default RECOMMENDATIONS_PATH)")
+    parser.add_argument("--top-k", type=int, default=recommendations.RECOMMENDATIONS_TOP_K, help="similar books kept per book (default RECOMMENDATIONS_TOP_K)")
+    args = parser.parse_args()
+    print("Building recommendations...")
+    build_recommendations(args.output, args.top_k)
@@ -0,0 +1,26 @@
+import argparse
+from app.database.connection import SessionLocal
+from app.services import fines
+
+def compute_fines(full: bool = False):
+    db = SessionLocal()
+    try:
+        totals = fines.compute_fines(db, full=full)
+        if totals is None:
+            print("Fines are already being computed by another process; nothing to do.")
+            return
+        print("Fines computed successfully!")
+        for name, value in totals.items():
+            print(f"{name}: {value}")
+    except Exception as e:
+        print(f"Error computing fines: {e}")
+        raise SystemExit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute overdue fines for book loans")
+    parser.add_argument("--full", action="store_true", help="revisit every loan instead of only those changed since the last run")
+    args = parser.parse_args()
+    print("Computing fines...")
+    compute_fines(full=args.full)
@@ -0,0 +1,45 @@
+import argparse
+import time
+from app.services import catalog_import
+
+def import_catalog(args):
+    last_report = 0.0
+
+    def progress(totals):
+        nonlocal last_report
+        if time.monotonic() - last_report >= 2:
+            last_report = time.monotonic()
+            print(f"  {totals['imported']} imported, {totals['rejected']} rejected, {totals['rows_per_second']} rows/s")
+
+    try:
+        totals = catalog_import.import_file(
+            args.path,
+            fmt=args.format,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            checkpoint_path=None if args.no_checkpoint else args.checkpoint or f"{args.path}.checkpoint",
+            url=args.url,
+            index=not args.skip_search_index,
+            progress=progress,
+        )
+    except catalog_import.ImportFormatError as e:
+        print(f"Error importing catalog: {e}")
+        raise SystemExit(1)
+    print("Catalog imported successfully!")
+    for name, value in totals.items():
+        print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a CSV, JSONL or MARC21 catalog file into the books table")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(catalog_import.READERS), help="defaults to the file extension")
+    parser.add_argument("--workers", type=int, default=1, help="parallel writer processes")
+    parser.add_argument("--batch-size", type=int, default=catalog_import.IMPORT_BATCH_SIZE)
+    parser.add_argument("--checkpoint", help="checkpoint file, defaults to <path>.checkpoint; rerun to resume")
+    parser.add_argument("--no-checkpoint", action="store_true", help="always start from the beginning of the file")
+    parser.add_argument("--skip-search-index", action="store_true",
+                        help="do not update the search index (imported books will not show up in search)")
+    parser.add_argument("--url", help="database URL, defaults to the one configured in .env")
+    args = parser.parse_args()
+    print("Importing catalog...")
+    import_catalog(args)
@@ -1,7 +1,9 @@
 from datetime import datetime, timezone
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.database.models import Base, User, UserRole
+from app.database.migrate import migrate
+from app.database.models import User, UserRole
+from app.services import stats  # noqa: F401 - keeps dashboard counters in sync
 from app.utils.auth import get_password_hash
 import os
 from dotenv import load_dotenv
@@ -21,8 +23,8 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_users():
-    # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    # Create tables and indexes if they don't exist
+    migrate(engine)
     
     db = SessionLocal()
     
@@ -0,0 +1,25 @@
+import argparse
+from app.database.connection import get_engine
+from app.database.migrate import migrate
+
+def run(dry_run: bool = False):
+    try:
+        changes = migrate(get_engine(), dry_run=dry_run)
+    except Exception as e:
+        print(f"Error migrating the database: {e}")
+        raise SystemExit(1)
+    if not changes:
+        print("Database schema is up to date.")
+        return
+    print("Pending changes:" if dry_run else "Database schema migrated successfully!")
+    for kind, name in changes:
+        print(f"{kind}: {name}")
+    if dry_run:
+        raise SystemExit(2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the tables and indexes the models define but the database lacks")
+    parser.add_argument("--dry-run", action="store_true", help="only list the pending changes; exits with 2 if there are any")
+    args = parser.parse_args()
+    print("Migrating database schema...")
+    run(dry_run=args.dry_run)
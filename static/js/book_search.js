@@ -0,0 +1,30 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const input = document.querySelector('input[name="q"]');
+    const suggestions = document.getElementById('book-suggestions');
+    if (!input || !suggestions) {
+        return;
+    }
+
+    let timer = null;
+    input.addEventListener('input', function() {
+        // Debounce keystrokes before asking the server for completions
+        clearTimeout(timer);
+        const query = this.value.trim();
+        if (query.length < 2) {
+            return;
+        }
+        timer = setTimeout(async function() {
+            const response = await fetch(`/member/books/autocomplete?q=${encodeURIComponent(query)}`);
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            suggestions.innerHTML = '';
+            data.suggestions.forEach(function(text) {
+                const option = document.createElement('option');
+                option.value = text;
+                suggestions.appendChild(option);
+            });
+        }, 150);
+    });
+});
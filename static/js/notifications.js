@@ -0,0 +1,38 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const area = document.getElementById('notifications');
+    if (!area || !window.EventSource) {
+        return;
+    }
+
+    const messages = {
+        hold_ready: function(data) {
+            return `"${data.title}" is ready for you to borrow until ${data.expires_at.slice(0, 10)}.`;
+        },
+        loan_due_soon: function(data) {
+            return `"${data.title}" is due on ${data.due_date.slice(0, 10)}.`;
+        },
+        loan_overdue: function(data) {
+            return `"${data.title}" is now overdue.`;
+        },
+    };
+
+    function show(text) {
+        const notice = document.createElement('p');
+        notice.className = 'mb-4 text-blue-600';
+        notice.textContent = text + ' ';
+        const link = document.createElement('a');
+        link.href = '/member/dashboard';
+        link.className = 'underline';
+        link.textContent = 'View dashboard';
+        notice.appendChild(link);
+        area.appendChild(notice);
+    }
+
+    // The browser reconnects on its own when the stream drops
+    const events = new EventSource('/member/events');
+    Object.keys(messages).forEach(function(kind) {
+        events.addEventListener(kind, function(event) {
+            show(messages[kind](JSON.parse(event.data)));
+        });
+    });
+});